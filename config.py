@@ -10,19 +10,57 @@ from construct.controls.expression import Implies, Event, Eventually, Constraint
 
 neo4j_uri = "bolt://localhost:7687"
 neo4j_auth = ("neo4j", "12341234")
+neo4j_concurrency = 4
+neo4j_fetch_size = 10_000
+neo4j_profile = None
 neo4j_db_dir = r"E:\neo4j\relate-data\dbmss\dbms-1ea13b42-8416-4b56-ad78-f5db6911e301"
 neo4j_import_dir = neo4j_db_dir + r"\import"
 neo4j_bin_dir = neo4j_db_dir + r"\bin"
+bulk_import_dir = neo4j_import_dir + r"\bulk"
 
 csv_import_dir = r"E:\thesis-data\CSVs"
 activities_file = r"E:\thesis-data\changeActivityPurchase.xlsx"
+csv_cache_dir = csv_import_dir + r"\.cache"
+csv_cache_validation = "stat"
 transform_export_dir = neo4j_import_dir
+report_dir = r"E:\thesis-data\reports"
+report_regression_factor = 1.5
+report_regression_min_seconds = 1
+slow_query_seconds = 10
+slow_query_log = report_dir + r"\slow-queries.jsonl"
 
 company = "C110"
 
-step_nuke_transformed = True
+generate_scale = 1
+generate_lines_per_order = 3
+generate_trace_skew = 2.0
+generate_sod_conflict_rate = 0.05
+generate_max_changes = 20
+generate_seed = 42
+generate_chunk_orders = 100_000
 
+step_nuke_transformed = False
+transform_lazy = True
+transform_workers = None
+transform_streaming = False
+transform_memory_budget = 4 * 1024**3
+transform_ingest = False
+transform_derive = False
+ingest_batch_size = 10_000
+
+construct_workers = 8
+load_probe_rows = 10_000
+load_transaction_seconds = 2
+load_batch_min = 1_000
+load_batch_max = 500_000
+load_node_concurrency = 1
+load_relation_concurrency = 1
+load_retries = 3
+graph_batch_size = None
+
+step_bulk_import = False
 step_nuke_graph = True
+step_create_indexes = True
 step_construct_graph = True
 step_reify_relations = True
 step_create_roots = True
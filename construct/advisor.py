@@ -0,0 +1,163 @@
+import logging
+import re
+from collections import defaultdict
+from pathlib import Path
+
+import config as cfg
+from construct import query
+from construct.load.loader import RelationLoader
+
+root = Path(__file__).parent.parent
+
+clause = re.compile(r"\b(MATCH|MERGE|CREATE)\b")
+# a property map, which may hold values that the dashboard interpolates, such as `{line_no}`
+property_map = r"\{(?:[^{}]|\{\w+\})*\}"
+node = re.compile(rf"\((\w*)((?::\w+)+)\s*({property_map}|WHERE [^)]*)?\)")
+relationship = re.compile(rf"\[(\w*):(\w+)\*?\s*({property_map})?\]")
+key = re.compile(r"(\w+)\s*:")
+predicate = re.compile(r"\w+\.(\w+)\s*(?:=|IN\b)")
+
+# properties that discriminate the nodes of a label, which come first in a composite index
+discriminators = ["EventType", "EntityType"]
+
+
+class Advisor:
+    """
+    Derives the indexes and constraints of the graph from the lookups the queries of the pipeline make. Every node or
+    relationship pattern in a MATCH or MERGE clause that filters on properties is a lookup, served by a composite index
+    on those properties, with the type discriminator first. A node that is merged on a single property is identified
+    by it, so that lookup is served by a uniqueness constraint instead.
+    """
+
+    def __init__(self):
+        # (kind, label, properties) -> names of the queries that make the lookup
+        self._lookups = defaultdict(set)
+        self._unique = set()
+
+    def add(self, name: str, q: str, parameters: dict = None):
+        for match in node.finditer(q):
+            _, labels, filters = match.groups()
+            properties = _properties(filters)
+            used_in = _clause(q, match.start())
+            if len(properties) == 0 or used_in == "CREATE":
+                continue
+
+            for label in labels.strip(":").split(":"):
+                self._lookups[("node", label, properties)].add(name)
+                if used_in == "MERGE" and len(properties) == 1:
+                    self._unique.add(("node", label, properties))
+
+        for match in relationship.finditer(q):
+            _, rel_type, filters = match.groups()
+            properties = _properties(filters)
+
+            if len(properties) > 0 and _clause(q, match.start()) != "CREATE":
+                self._lookups[("relationship", rel_type, properties)].add(name)
+
+    def add_pipeline(self):
+        """
+        Adds the queries that load the exported relation files, the queries of the construct steps, the queries that
+        check the controls and the queries of the dashboard.
+        """
+        for data in RelationLoader():
+            self.add(
+                data.construct().file_name(),
+                *data.query(concurrency=cfg.load_relation_concurrency),
+            )
+
+        for rel in query.reified:
+            self.add(f"reify({rel})", *query.reify(rel))
+        self.add("correlate_derived", *query.correlate_derived())
+        self.add("create_roots", *query.create_roots())
+        self.add("create_df", *query.create_df())
+        for control in cfg.controls:
+            self.add(
+                f"create_df({control.id})", *query.create_df(control.find_events())
+            )
+            self.add(
+                f"mark_projection({control.id})",
+                *query.mark_projection(control.find_events(), 0),
+            )
+            self.add(f"check_query({control.id})", *control.check_query())
+        self.add(
+            "verify_no_crossing_df_projections",
+            *query.verify_no_crossing_df_projections(),
+        )
+        self.add(
+            "verify_violating_events_have_df_projection",
+            *query.verify_violating_events_have_df_projection(),
+        )
+
+        for name, q in _dashboard_queries(root.joinpath("visualize", "app.py")):
+            self.add(f"visualize.{name}", q)
+
+    def statements(self) -> list[str]:
+        return [_statement(lookup, lookup in self._unique) for lookup in self._lookups]
+
+    def report(self):
+        """
+        Logs every index and constraint together with the queries it serves.
+        """
+        for lookup, names in self._lookups.items():
+            logging.info(
+                f"{_statement(lookup, lookup in self._unique)} serves:\n"
+                + "\n".join([f"- {name}" for name in sorted(names)])
+            )
+
+
+def _clause(q: str, position: int) -> str | None:
+    clauses = clause.findall(q, 0, position)
+    return clauses[-1] if len(clauses) > 0 else None
+
+
+def _properties(filters: str | None) -> tuple[str, ...]:
+    if filters is None:
+        return ()
+
+    if filters.startswith("{"):
+        properties = key.findall(filters)
+    else:
+        properties = predicate.findall(filters)
+
+    return tuple(
+        sorted(
+            dict.fromkeys(properties),
+            key=lambda p: (p not in discriminators, properties.index(p)),
+        )
+    )
+
+
+def _statement(lookup: tuple[str, str, tuple[str, ...]], unique: bool) -> str:
+    kind, label, properties = lookup
+
+    if kind == "relationship":
+        on = ", ".join([f"r.{p}" for p in properties])
+        return f"CREATE INDEX IF NOT EXISTS FOR ()-[r:{label}]-() ON ({on})"
+
+    if unique:
+        return f"CREATE CONSTRAINT IF NOT EXISTS FOR (n:{label}) REQUIRE n.{properties[0]} IS UNIQUE"
+
+    on = ", ".join([f"n.{p}" for p in properties])
+    return f"CREATE INDEX IF NOT EXISTS FOR (n:{label}) ON ({on})"
+
+
+def _dashboard_queries(file: Path) -> list[tuple[str, str]]:
+    """
+    Extracts the queries from the source of the dashboard, which cannot be imported outside of streamlit, together
+    with the name of the function that runs them. Interpolated values are left as they are written.
+    """
+    source = file.read_text(encoding="utf-8")
+    functions = [(m.start(), m.group(1)) for m in re.finditer(r"def (\w+)", source)]
+
+    queries = []
+    for match in re.finditer(r'(f?)"""(.*?)"""', source, re.DOTALL):
+        if "MATCH" not in match.group(2):
+            continue
+
+        name = [f for position, f in functions if position < match.start()][-1]
+        q = match.group(2)
+        if match.group(1) == "f":
+            q = q.replace("{{", "{").replace("}}", "}")
+        queries.append((name, q))
+
+    return queries
@@ -13,6 +13,13 @@ class ConstraintClause(ABC):
     def __str__(self):
         pass
 
+    @abstractmethod
+    def resolve(self, parameters: dict) -> str:
+        """
+        Returns the Cypher text of the clause, adding the values it refers to to the parameters.
+        """
+        pass
+
 
 class ConstraintAtom(ABC):
     def __init__(self, _type: str):
@@ -22,6 +29,13 @@ class ConstraintAtom(ABC):
     def __str__(self):
         pass
 
+    @abstractmethod
+    def resolve(self, parameters: dict) -> str:
+        """
+        Returns the Cypher text of the atom, adding the values it refers to to the parameters.
+        """
+        pass
+
 
 class Attribute(ConstraintAtom):
     def __init__(self, binding: str, name: str):
@@ -32,6 +46,9 @@ class Attribute(ConstraintAtom):
     def __str__(self):
         return f"{self.binding}.{self.name}"
 
+    def resolve(self, parameters: dict) -> str:
+        return str(self)
+
 
 class StrLiteral(ConstraintAtom):
     def __init__(self, value: str):
@@ -41,6 +58,10 @@ class StrLiteral(ConstraintAtom):
     def __str__(self):
         return f"'{self.value}'"
 
+    def resolve(self, parameters: dict) -> str:
+        parameters[self.id] = self.value
+        return f"${self.id}"
+
 
 class ComparisonOperator(Enum):
     EQUALS = 1
@@ -81,6 +102,9 @@ class Comparison(ConstraintClause):
     def __str__(self):
         return f"{self.left} {self.operator} {self.right}"
 
+    def resolve(self, parameters: dict) -> str:
+        return f"{self.left.resolve(parameters)} {self.operator} {self.right.resolve(parameters)}"
+
 
 class And(ConstraintClause):
     def __init__(self, *clauses: ConstraintClause):
@@ -89,3 +113,6 @@ class And(ConstraintClause):
 
     def __str__(self):
         return f"{' AND '.join([str(clause) for clause in self.clauses])}"
+
+    def resolve(self, parameters: dict) -> str:
+        return " AND ".join([clause.resolve(parameters) for clause in self.clauses])
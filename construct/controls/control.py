@@ -11,15 +11,18 @@ class Control:
         self.description = description
         self.expression = expression
 
-    def check_query(self):
+    def check_query(self) -> tuple[str, dict]:
+        parameters = {"control": self.id, "description": self.description}
+
         query = f"""
-            CREATE ({self.id}:Control {{ ID: '{self.id}', Description: '{self.description}' }})
+            MERGE ({self.id}:Control {{ ID: $control }})
+            SET {self.id}.Description = $description
             WITH {self.id}
         """
 
-        query += self.expression.resolve(self)
+        query += self.expression.resolve(self, parameters)
 
-        return query
+        return query, parameters
 
     def find_events(self) -> tuple[str, ...]:
         events = set()
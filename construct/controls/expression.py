@@ -2,6 +2,7 @@ import itertools
 from abc import ABC, abstractmethod
 
 from construct.controls.constraint import ConstraintClause
+from construct.query import projection_id
 
 i = itertools.count()
 
@@ -51,9 +52,9 @@ class Implies(LTLExpression):
         self.left.find_events(events)
         self.right.find_events(events)
 
-    def resolve(self, control):
+    def resolve(self, control, parameters: dict):
         if isinstance(self.left, Implies) and isinstance(self.right, Constraint):
-            return ImpliedPathConstraintStrategy(self).resolve(control)
+            return ImpliedPathConstraintStrategy(self).resolve(control, parameters)
 
 
 class Eventually(LTLExpression):
@@ -80,11 +81,11 @@ class And(LTLExpression):
         for expr in self._expressions:
             expr.find_events(events)
 
-    def resolve(self, control):
+    def resolve(self, control, parameters: dict):
         return f"""
             UNION
         """.join(
-            expr.resolve(control) for expr in self._expressions
+            expr.resolve(control, parameters) for expr in self._expressions
         )
 
 
@@ -111,6 +112,9 @@ class Constraint(LTLExpression):
     def find_events(self, events: set[str]):
         pass
 
+    def condition(self, parameters: dict) -> str:
+        return self._clause.resolve(parameters)
+
 
 class Event(LTLAtom):
     def __init__(self, binding: str, event_type: str):
@@ -127,7 +131,7 @@ class Event(LTLAtom):
 
 class QueryStrategy(ABC):
     @abstractmethod
-    def resolve(self, control):
+    def resolve(self, control, parameters: dict):
         pass
 
 
@@ -136,7 +140,7 @@ class ImpliedPathConstraintStrategy(QueryStrategy):
         super().__init__()
         self._implies = implies
 
-    def resolve(self, control):
+    def resolve(self, control, parameters: dict):
         left: Implies = self._implies.left
         right: Constraint = self._implies.right
 
@@ -144,16 +148,20 @@ class ImpliedPathConstraintStrategy(QueryStrategy):
         eventually: Eventually = left.right
         target: Event = eventually.event
 
-        h = hash(control.find_events())
+        parameters[source.id] = source.event_type
+        parameters[target.id] = target.event_type
+        parameters["projection"] = projection_id(control.find_events())
+
+        subset = self._implies.subset
 
         return f"""
-            MATCH ({source.binding}:Event {{ EventType: '{source.event_type}' }}),
-                  ({target.binding}:Event {{ EventType: '{target.event_type}' }}),
-                  p=({source.binding})-[:DF_PROJECTION {{ ID: '{h}' }}]->({target.binding})
-            {f'WHERE {self._implies.subset}' if self._implies.subset else ''}
-            {'   AND' if self._implies.subset else 'WHERE'} NOT ({str(right)})
+            MATCH ({source.binding}:Event {{ EventType: ${source.id} }}),
+                  ({target.binding}:Event {{ EventType: ${target.id} }}),
+                  p=({source.binding})-[:DF_PROJECTION {{ ID: $projection }}]->({target.binding})
+            {f'WHERE {subset.resolve(parameters)}' if subset else ''}
+            {'   AND' if subset else 'WHERE'} NOT ({right.condition(parameters)})
             WITH {source.binding}, {target.binding}, p
-            MATCH ({control.id}:Control {{ID: '{control.id}'}})
+            MATCH ({control.id}:Control {{ID: $control}})
             MERGE ({source.binding})-[:VIOLATES]->({control.id})
             MERGE ({target.binding})-[:VIOLATES]->({control.id})
         """
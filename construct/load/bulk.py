@@ -0,0 +1,282 @@
+import logging
+import os
+import re
+from pathlib import Path
+
+import polars as pl
+
+import config as cfg
+from construct.load.loader import file_schema
+from graph_construct import Derived, Entity, GraphConstruct, Relation
+
+# types of the columns that the LOAD CSV queries do not store as strings, for files without a schema sidecar
+types = {
+    "Timestamp": "datetime",
+    "start": "datetime",
+    "end": "datetime",
+    "Date": "long",
+    "Time": "time",
+}
+
+# import types of the polars data types, like the loader converts them
+dtypes = {
+    "Int8": "long",
+    "Int16": "long",
+    "Int32": "long",
+    "Int64": "long",
+    "UInt8": "long",
+    "UInt16": "long",
+    "UInt32": "long",
+    "UInt64": "long",
+    "Float32": "double",
+    "Float64": "double",
+    "Boolean": "boolean",
+    "Datetime": "datetime",
+    "Date": "date",
+    "Time": "time",
+}
+
+
+class BulkImport:
+    """
+    Generates the input of `neo4j-admin database import full` from the files written by the transform, which builds
+    the same graph as the LOAD CSV queries of the loader. Every node file gets its own ID group in which the row number
+    is the ID, and the relations are resolved to these IDs by joining them to the node files on their key columns, so
+    that a row matching several nodes yields a relation to each of them.
+
+    If the transform derived the compound entities, the relations between entities are replaced by the DERIVED files,
+    which refer to the nodes by the same row numbers.
+    """
+
+    def __init__(self):
+        self._import_path = Path(cfg.neo4j_import_dir)
+        self._path = Path(cfg.bulk_import_dir)
+        self._path.mkdir(parents=True, exist_ok=True)
+        self._nodes = []
+        self._relationships = []
+
+    def generate(self) -> str:
+        """
+        Writes the node and relationship files and the import command, and returns the command.
+        """
+        for file in sorted(self._import_path.glob("EVENT*.csv")):
+            self._write_nodes(file)
+        for file in sorted(self._import_path.glob("ENTITY*.csv")):
+            self._write_nodes(file)
+        for file in sorted(self._import_path.glob("RELATION*.csv")):
+            self._write_relationships(file)
+        if cfg.transform_derive:
+            self._write_derived()
+
+        command = self.command()
+        script = "import.cmd" if os.name == "nt" else "import.sh"
+        self._path.joinpath(script).write_text(command + "\n")
+
+        return command
+
+    def command(self) -> str:
+        neo4j_admin = Path(cfg.neo4j_bin_dir).joinpath("neo4j-admin")
+
+        return " ".join(
+            [
+                f'"{neo4j_admin}" database import full neo4j',
+                "--overwrite-destination",
+                '--delimiter=";"',
+                '--array-delimiter="|"',
+                *[f'--nodes="{f}"' for f in self._nodes],
+                *[f'--relationships="{f}"' for f in self._relationships],
+            ]
+        )
+
+    def _write_nodes(self, file: Path):
+        construct = GraphConstruct.parse(file)
+        schema = file_schema(file)
+        df = _scan(file)
+
+        df = df.select(
+            [
+                pl.col(":ID").alias(f":ID({_group(construct.file_name())})"),
+                pl.lit(construct.type()).alias(":LABEL"),
+                pl.lit(construct.name()).alias(f"{construct.type()}Type:string"),
+                *[_property(col, schema) for col in df.columns if col != ":ID"],
+            ]
+        )
+
+        self._nodes.append(self._write(df, file))
+
+    def _write_relationships(self, file: Path):
+        construct = GraphConstruct.parse(file)
+        assert isinstance(construct, Relation)
+
+        source, target = construct.source(), construct.target()
+        if cfg.transform_derive and all(
+            isinstance(n, Entity) for n in [source, target]
+        ):
+            return
+
+        for node in [source, target]:
+            if not self._import_path.joinpath(f"{node.file_name()}.csv").exists():
+                logging.warning(f"Skipping {file}, {node.file_name()} was not exported")
+                return
+
+        schema = file_schema(file)
+        df = _scan(file)
+        src_col = [col for col in df.columns if col.startswith("from_")][0]
+        tgt_col = [col for col in df.columns if col.startswith("to_")][0]
+        rest_col = [col for col in df.columns if col not in [src_col, tgt_col, ":ID"]]
+
+        df = df.join(
+            self._keys(source, src_col.replace("from_", ""), "source"),
+            left_on=src_col,
+            right_on="key",
+        ).join(
+            self._keys(target, tgt_col.replace("to_", ""), "target"),
+            left_on=tgt_col,
+            right_on="key",
+        )
+
+        if source.type() != target.type():
+            rel_type = "CORR"
+            ltr = source.type() == "Event"
+        else:
+            rel_type = "REL"
+            ltr = True
+
+        start, end = ("source", "target") if ltr else ("target", "source")
+        start_node, end_node = (source, target) if ltr else (target, source)
+
+        df = df.select(
+            [
+                pl.col(start).alias(f":START_ID({_group(start_node.file_name())})"),
+                pl.col(end).alias(f":END_ID({_group(end_node.file_name())})"),
+                pl.lit(rel_type).alias(":TYPE"),
+                pl.lit(construct.name()).alias("RelationType:string"),
+                *[_property(col, schema) for col in rest_col],
+            ]
+        )
+
+        self._relationships.append(self._write(df, file))
+
+    def _write_derived(self):
+        compound = Derived("compound")
+        file = self._import_path.joinpath(f"{compound.file_name()}.csv")
+
+        df = _scan(file).select(
+            [
+                pl.col("Key").alias(f":ID({_group(compound.file_name())})"),
+                pl.when(pl.col("Root") == "true")
+                .then(pl.lit("Entity;Root"))
+                .otherwise(pl.lit("Entity"))
+                .alias(":LABEL"),
+                pl.col("ID").alias("ID:string"),
+                pl.col("EntityType").alias("EntityType:string"),
+                pl.lit("true").alias("Compound:boolean"),
+            ]
+        )
+        self._nodes.append(self._write(df, file))
+
+        self._write_derived_relationships(
+            Derived("reified"),
+            "REL",
+            [
+                pl.lit("REIFIED").alias("RelationType:string"),
+                pl.col("Source").alias("Source:string"),
+            ],
+        )
+        self._write_derived_relationships(
+            Derived("rel"), "REL", [pl.col("RelationType").alias("RelationType:string")]
+        )
+        self._write_derived_relationships(Derived("corr"), "CORR", [])
+        self._write_derived_relationships(Derived("df"), "DF", [])
+        self._write_derived_relationships(
+            Derived("df_projection"), "DF_PROJECTION", [pl.col("ID").alias("ID:string")]
+        )
+
+        projection = Derived("projection")
+        file = self._import_path.joinpath(f"{projection.file_name()}.csv")
+        df = _scan(file).select(
+            [
+                pl.col(":ID").alias(f":ID({_group(projection.file_name())})"),
+                pl.lit("Projection").alias(":LABEL"),
+                pl.col("ID").alias("ID:string"),
+                pl.col("Correlations").alias("Correlations:long"),
+            ]
+        )
+        self._nodes.append(self._write(df, file))
+
+    def _write_derived_relationships(
+        self, construct: Derived, rel_type: str, properties: list[pl.Expr]
+    ):
+        """
+        Writes a derived relation file once for every pair of node files it relates, as an ID group is fixed per
+        column. Ends without a file column are compound entities.
+        """
+        file = self._import_path.joinpath(f"{construct.file_name()}.csv")
+        df = pl.read_csv(file, separator=";", infer_schema_length=0)
+
+        compound = Derived("compound").file_name()
+        for col in ["from_File", "to_File"]:
+            if col not in df.columns:
+                df = df.with_columns(pl.lit(compound).alias(col))
+
+        for (start, end), part in df.group_by(["from_File", "to_File"]):
+            part = part.lazy().select(
+                [
+                    pl.col("from_Row").alias(f":START_ID({_group(start)})"),
+                    pl.col("to_Row").alias(f":END_ID({_group(end)})"),
+                    pl.lit(rel_type).alias(":TYPE"),
+                    *properties,
+                ]
+            )
+            self._relationships.append(
+                self._write(part, file.with_name(f"{file.stem}_{start}_{end}.csv"))
+            )
+
+    def _keys(self, node: GraphConstruct, key: str, alias: str) -> pl.LazyFrame:
+        """
+        Returns the ID and key property of every node in the file of the construct. Nodes without the key are never
+        matched, as nulls do not join.
+        """
+        return _scan(self._import_path.joinpath(f"{node.file_name()}.csv")).select(
+            [pl.col(":ID").alias(alias), pl.col(key).alias("key")]
+        )
+
+    def _write(self, df: pl.LazyFrame, file: Path) -> Path:
+        target = self._path.joinpath(file.name)
+        df.collect().write_csv(target, separator=";")
+
+        logging.info(f"Wrote to file {target}")
+
+        return target
+
+
+def _scan(file: Path) -> pl.LazyFrame:
+    """
+    Scans a file with all columns as strings, like LOAD CSV reads them, and numbers its rows in the `:ID` column.
+    """
+    return pl.scan_csv(file, separator=";", infer_schema_length=0, row_count_name=":ID")
+
+
+def _property(col: str, schema: dict[str, str] | None) -> pl.Expr:
+    if schema is not None:
+        dtype = dtypes.get(schema[col].split("(")[0], "string")
+        return pl.col(col).alias(f"{col}:{dtype}")
+
+    if col == "Date":
+        return (
+            pl.col(col)
+            .str.strptime(pl.Date, "%d-%m-%Y")
+            .cast(pl.Datetime("ms"))
+            .cast(pl.Int64)
+            .alias(_header(col))
+        )
+
+    return pl.col(col).alias(_header(col))
+
+
+def _header(col: str) -> str:
+    return f"{col}:{types.get(col, 'string')}"
+
+
+def _group(file_name: str) -> str:
+    return re.sub(r"\W+", "_", file_name).strip("_")
@@ -0,0 +1,150 @@
+import logging
+import threading
+
+import polars as pl
+
+import config as cfg
+from driver import Driver
+from graph_construct import GraphConstruct, Relation
+from construct.advisor import Advisor
+from construct.load.loader import indexes
+
+
+class Ingestor(object):
+    """
+    Creates the graph directly from the frames of the transform, in batches of rows that are sent over Bolt and
+    unwound by parameterised queries, instead of reading the exported files with LOAD CSV. The values keep their
+    types, so the database and the transform no longer need to share the import directory.
+    """
+
+    _instance = None
+    _nodes = None
+    _relations = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(Ingestor, cls).__new__(cls)
+            cls._nodes = []
+            cls._relations = []
+
+        return cls._instance
+
+    def add(self, df: pl.DataFrame | pl.LazyFrame, construct: GraphConstruct):
+        with self._lock:
+            if isinstance(construct, Relation):
+                self._relations.append((df, construct))
+            else:
+                self._nodes.append((df, construct))
+
+    def flush(self):
+        """
+        Ingests all added frames, the nodes first, so that every relation finds its source and target. The graph has
+        to be empty, as it is only ever dropped by the `nuke_graph` step of the construct.
+        """
+        driver = Driver()
+
+        filled = driver.query("MATCH (n) RETURN count(n) > 0 AS filled")
+        if len(filled) > 0 and filled[0]["filled"]:
+            raise Exception(
+                "The graph is not empty, drop it with the nuke_graph step of the construct, with transform_ingest disabled, before ingesting"
+            )
+
+        for q in indexes:
+            driver.query(q)
+
+        for df, construct in self._nodes:
+            self._ingest(df, construct, *_node_query(construct, df.columns))
+
+        advisor = Advisor()
+        for df, construct in self._relations:
+            advisor.add(construct.file_name(), *_relation_query(construct, df.columns))
+        for q in advisor.statements():
+            driver.query(q)
+
+        for df, construct in self._relations:
+            self._ingest(df, construct, *_relation_query(construct, df.columns))
+
+        self._nodes, self._relations = [], []
+
+    def _ingest(
+        self,
+        df: pl.DataFrame | pl.LazyFrame,
+        construct: GraphConstruct,
+        query: str,
+        parameters: dict,
+    ):
+        if isinstance(df, pl.LazyFrame):
+            df = df.collect()
+
+        logging.info(f"Ingesting {len(df)} rows of {construct.file_name()}...")
+
+        driver = Driver()
+        for batch in _native(df).iter_slices(cfg.ingest_batch_size):
+            driver.write(query, batch.to_dicts(), parameters)
+
+
+def _native(df: pl.DataFrame) -> pl.DataFrame:
+    """
+    Decodes categoricals to strings and stores naive datetimes in UTC, like `datetime()` reads them when loading a
+    file.
+    """
+    return df.with_columns(
+        [pl.col(pl.Categorical).cast(pl.Utf8)]
+        + [
+            pl.col(col).dt.replace_time_zone("UTC")
+            for col, dtype in df.schema.items()
+            if dtype == pl.Datetime and dtype.time_zone is None
+        ]
+    )
+
+
+def _properties(columns: list[str]) -> str:
+    return ", ".join([f"{col}: row.{col}" for col in columns])
+
+
+def _node_query(construct: GraphConstruct, columns: list[str]) -> tuple[str, dict]:
+    query = "UNWIND $rows AS row\n"
+    query += f" CREATE (e:{construct.type()} {{ {construct.type()}Type: $name"
+    if len(columns) > 0:
+        query += f", {_properties(columns)}"
+    query += " })"
+
+    return query, {"name": construct.name()}
+
+
+def _relation_query(construct: Relation, columns: list[str]) -> tuple[str, dict]:
+    src_type = construct.source().type()
+    tgt_type = construct.target().type()
+
+    src_col = [col for col in columns if col.startswith("from_")][0]
+    tgt_col = [col for col in columns if col.startswith("to_")][0]
+    rest_col = [col for col in columns if col not in [src_col, tgt_col]]
+
+    src_key = src_col.replace("from_", "")
+    tgt_key = tgt_col.replace("to_", "")
+
+    if src_type != tgt_type:
+        rel_type = "CORR"
+        ltr = src_type == "Event"
+    else:
+        rel_type = "REL"
+        ltr = True
+
+    rel_block = f"[:{rel_type} {{ RelationType: $relation"
+    if len(rest_col) > 0:
+        rel_block += f", {_properties(rest_col)}"
+    rel_block += " }]"
+
+    query = "UNWIND $rows AS row\n"
+    query += f"  MATCH (s:{src_type} {{ {src_type}Type: $source, {src_key}: row.{src_col} }}),\n"
+    query += f"        (t:{tgt_type} {{ {tgt_type}Type: $target, {tgt_key}: row.{tgt_col} }}) \n"
+    query += "  CREATE (s)"
+    query += f"-{rel_block}->" if ltr else f"<-{rel_block}-"
+    query += "(t)"
+
+    return query, {
+        "source": construct.source().name(),
+        "target": construct.target().name(),
+        "relation": construct.name(),
+    }
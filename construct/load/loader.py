@@ -1,41 +1,105 @@
 import csv
+import json
 from pathlib import Path
 
+import polars as pl
+
 import config as cfg
 from graph_construct import GraphConstruct, Relation
 
 
 class DataFile:
+    _path: Path = None
     _uri: str = None
     _headers: list[str] = []
+    _schema: dict[str, str] = None
     _construct: GraphConstruct = None
 
     def __init__(self, path: Path):
+        self._path = path
         self._headers = _csv_headers(path)
+        self._schema = file_schema(path)
         self._construct = GraphConstruct.parse(path)
         self._uri = path.as_uri().replace(
             Path(cfg.neo4j_import_dir).as_uri(), "file://"
         )
 
-    def query(self):
-        assert not isinstance(self._construct, Relation)
+    def construct(self) -> GraphConstruct:
+        return self._construct
+
+    def rows(self) -> int:
+        return (
+            pl.scan_csv(self._path, separator=";", infer_schema_length=0)
+            .select(pl.count())
+            .collect()
+            .item()
+        )
 
-        query = f"LOAD CSV WITH HEADERS FROM \"{self._uri}\" as line\n FIELDTERMINATOR ';'\n"
+    def query(self, batch_size: int = 1000, concurrency: int = 1) -> tuple[str, dict]:
+        """
+        Returns the query that loads the file in transactions of `batch_size` rows, of which `concurrency` run at the
+        same time, and its parameters.
+        """
+        query = "LOAD CSV WITH HEADERS FROM $uri as line\n FIELDTERMINATOR ';'\n"
         query += "CALL {\n"
         query += " WITH line\n"
-        for col in self._headers:
+        query += self._statement(concurrency > 1)
+        query += "\n"
+
+        if concurrency > 1:
+            query += (
+                f"}} IN {concurrency} CONCURRENT TRANSACTIONS OF {batch_size} ROWS;"
+            )
+        else:
+            query += f"}} IN TRANSACTIONS OF {batch_size} ROWS;"
+
+        return query, self._parameters()
+
+    def probe_query(self, rows: int) -> tuple[str, dict]:
+        """
+        Returns the query that loads the first rows of the file in a single transaction, to measure the throughput,
+        and its parameters.
+        """
+        query = "LOAD CSV WITH HEADERS FROM $uri as line\n FIELDTERMINATOR ';'\n"
+        query += "WITH line LIMIT $rows\n"
+        query += self._statement()
+
+        return query, self._parameters() | {"rows": rows}
+
+    def _parameters(self) -> dict:
+        return {"uri": self._uri, "name": self._construct.name()}
+
+    def _value(self, col: str) -> str:
+        """
+        Returns the expression that converts a column from the string LOAD CSV reads to the type it was written with.
+        Files without a schema sidecar only have their temporal columns converted, which are recognised by name.
+        """
+        if self._schema is None:
             if col in ["Timestamp", "start", "end"]:
-                column = f"datetime(line.{col})"
+                return f"datetime(line.{col})"
             elif col == "Date":
-                column = f'apoc.date.parse(line.{col}, "ms", "dd-MM-yyyy")'
+                return f'apoc.date.parse(line.{col}, "ms", "dd-MM-yyyy")'
             elif col == "Time":
-                column = f"time(line.{col})"
-            else:
-                column = "line." + col
+                return f"time(line.{col})"
+
+            return f"line.{col}"
+
+        conversion = conversions.get(self._schema[col].split("(")[0])
+        if conversion is None:
+            return f"line.{col}"
+
+        return f"{conversion}(line.{col})"
+
+    def _statement(self, concurrent: bool = False) -> str:
+        assert not isinstance(self._construct, Relation)
+
+        statement = ""
+        for col in self._headers:
+            column = self._value(col)
 
             new_line = ""
             if self._headers.index(col) == 0:
-                new_line += f" CREATE (e:{self._construct.type()} {{ {self._construct.type()}Type: '{self._construct.name()}'"
+                new_line += f" CREATE (e:{self._construct.type()} {{ {self._construct.type()}Type: $name"
                 if len(self._headers) > 0:
                     new_line += ", "
 
@@ -50,26 +114,34 @@ class DataFile:
             if self._headers.index(col) == len(self._headers) - 1:
                 new_line += f" }})"
 
-            query += new_line
+            statement += new_line
 
-        query += "\n"
-        query += "} IN TRANSACTIONS OF 1000 ROWS;"
-        return query
+        return statement
 
 
 class RelationDataFile(DataFile):
+    """
+    Relations are created, one for every row, like the bulk import does. Only when the transactions of a load run
+    concurrently are they merged instead, so that a load that was aborted by a deadlock can be run again, which
+    collapses rows that relate the same pair of nodes twice.
+    """
+
     def __init__(self, path: Path):
         super().__init__(path)
 
-    def query(self):
+    def _parameters(self) -> dict:
+        return {
+            "uri": self._uri,
+            "source": self._construct.source().name(),
+            "target": self._construct.target().name(),
+            "relation": self._construct.name(),
+        }
+
+    def _statement(self, concurrent: bool = False) -> str:
         assert isinstance(self._construct, Relation)
 
         src_type = self._construct.source().type()
         tgt_type = self._construct.target().type()
-        src_name = self._construct.source().name()
-        tgt_name = self._construct.target().name()
-        rel_name = self._construct.name()
-
         src_col = list(filter(lambda x: x.startswith("from_"), self._headers))[0]
         tgt_col = list(filter(lambda x: x.startswith("to_"), self._headers))[0]
         rest_col = [col for col in self._headers if col not in [src_col, tgt_col]]
@@ -77,65 +149,61 @@ class RelationDataFile(DataFile):
         src_col = src_col.replace("from_", "")
         tgt_col = tgt_col.replace("to_", "")
 
-        query = f"LOAD CSV WITH HEADERS FROM \"{self._uri}\" as line\n FIELDTERMINATOR ';'\n"
-        query += "CALL {\n"
-        query += " WITH line\n"
-
-        query += f"  MATCH (s:{src_type} {{ {src_type}Type: '{src_name}', {src_col}: line.from_{src_col} }}),\n"
-        query += f"        (t:{tgt_type} {{ {tgt_type}Type: '{tgt_name}', {tgt_col}: line.to_{tgt_col} }}) \n"
+        statement = f"  MATCH (s:{src_type} {{ {src_type}Type: $source, {src_col}: {self._value('from_' + src_col)} }}),\n"
+        statement += f"        (t:{tgt_type} {{ {tgt_type}Type: $target, {tgt_col}: {self._value('to_' + tgt_col)} }}) \n"
 
-        query += f"  CREATE (s)"
+        statement += "  MERGE (s)" if concurrent else "  CREATE (s)"
 
         if src_type != tgt_type:
-            rel_block = f"[:CORR"
+            rel_block = f"[r:CORR"
             ltr = src_type == "Event"
         else:
-            rel_block = f"[:REL"
+            rel_block = f"[r:REL"
             ltr = True
 
-        rel_block += f" {{ RelationType: '{rel_name}'"
-
-        if len(rest_col) > 0:
-            rel_block += ", "
-
-        for col in rest_col:
-            rel_block += f"{col}: line.{col}"
-            if len(rest_col) > 1 and not rest_col.index(col) == len(rest_col) - 1:
-                rel_block += ", "
-
-        rel_block += f" }}]"
-
-        query += f"-{rel_block}->" if ltr else f"<-{rel_block}-"
-        query += f"(t) \n"
-
-        query += "} IN TRANSACTIONS OF 1000 ROWS;"
-
-        return query
-
-
-class RelationIndexDataFile(DataFile):
-    def __init__(self, path: Path):
-        super().__init__(path)
-
-    def query(self):
-        assert isinstance(self._construct, Relation)
-
-        src_type = self._construct.source().type()
-        tgt_type = self._construct.target().type()
-        src_name = self._construct.source().name()
-        tgt_name = self._construct.target().name()
-
-        src_col = list(filter(lambda x: x.startswith("from_"), self._headers))[
-            0
-        ].replace("from_", "")
-        tgt_col = list(filter(lambda x: x.startswith("to_"), self._headers))[0].replace(
-            "to_", ""
-        )
-
-        return [
-            f"CREATE INDEX IF NOT EXISTS FOR (s:{src_type}) ON (s.{src_col})",
-            f"CREATE INDEX IF NOT EXISTS FOR (t:{tgt_type}) ON (t.{tgt_col})",
-        ]
+        properties = [f"{col}: {self._value(col)}" for col in rest_col]
+        if concurrent or len(properties) == 0:
+            rel_block += " { RelationType: $relation }]"
+        else:
+            rel_block += f" {{ RelationType: $relation, {', '.join(properties)} }}]"
+
+        statement += f"-{rel_block}->" if ltr else f"<-{rel_block}-"
+        statement += f"(t)"
+
+        if concurrent and len(rest_col) > 0:
+            statement += "\n  ON CREATE SET "
+            statement += ", ".join(
+                [f"r.{col} = {self._value(col)}" for col in rest_col]
+            )
+
+        return statement
+
+
+# functions that convert a string to the Neo4j type of a polars data type, which is stored as a string otherwise
+conversions = {
+    "Int8": "toInteger",
+    "Int16": "toInteger",
+    "Int32": "toInteger",
+    "Int64": "toInteger",
+    "UInt8": "toInteger",
+    "UInt16": "toInteger",
+    "UInt32": "toInteger",
+    "UInt64": "toInteger",
+    "Float32": "toFloat",
+    "Float64": "toFloat",
+    "Boolean": "toBoolean",
+    "Datetime": "datetime",
+    "Date": "date",
+    "Time": "time",
+}
+
+indexes = [
+    "CREATE INDEX IF NOT EXISTS FOR (e:Event) ON (e.EventType)",
+    "CREATE INDEX IF NOT EXISTS FOR (e:Event) ON (e.Timestamp)",
+    "CREATE INDEX IF NOT EXISTS FOR (n:Entity) ON (n.EntityType)",
+    "CREATE INDEX IF NOT EXISTS FOR ()-[r:REL]-() ON (r.RelationType)",
+    "CREATE INDEX IF NOT EXISTS FOR ()-[c:CORR]-() ON (c.RelationType)",
+]
 
 
 class Loader:
@@ -174,12 +242,16 @@ class RelationLoader(Loader):
             self._data.append(RelationDataFile(file))
 
 
-class RelationIndexLoader(Loader):
-    def __init__(self):
-        super().__init__()
+def file_schema(file: Path) -> dict[str, str] | None:
+    """
+    Returns the polars data types a file was written with, from the schema sidecar the Saver writes next to it, or
+    None if there is no sidecar.
+    """
+    sidecar = file.with_suffix(".schema.json")
+    if not sidecar.exists():
+        return None
 
-        for file in self._import_path.glob("RELATION*.csv"):
-            self._data.append(RelationIndexDataFile(file))
+    return json.loads(sidecar.read_text())
 
 
 def _csv_headers(file: Path) -> list[str]:
@@ -1,8 +1,43 @@
+import logging
+import sys
+import time
+from collections import defaultdict
+from itertools import zip_longest
+
+from neo4j.exceptions import TransientError
+
 import config as cfg
 from construct import query
-from driver import Driver, SystemDriver
-from load.loader import EventLoader, EntityLoader, RelationIndexLoader, RelationLoader
-from util import execute
+from construct.advisor import Advisor
+from driver import Driver, SystemDriver, query_all
+from graph_construct import Relation
+from load.bulk import BulkImport
+from load.loader import (
+    DataFile,
+    EventLoader,
+    EntityLoader,
+    RelationLoader,
+    indexes,
+)
+from scheduler import Task, Scheduler
+from util import count_throughput, execute, report
+
+
+def bulk_import():
+    command = BulkImport().generate()
+    logging.info(f"Stop the database and run the import with:\n{command}")
+    logging.info(
+        "Then start the database and run the construct again with step_bulk_import, step_nuke_graph and "
+        "step_construct_graph disabled"
+    )
+
+
+if cfg.step_bulk_import:
+    execute("Generate bulk import files", bulk_import)
+
+    # the import needs the database to be stopped, so the steps on the graph run in the next run
+    report("construct")
+    sys.exit()
 
 
 def nuke_graph():
@@ -11,87 +46,293 @@ def nuke_graph():
     sys_driver.create_database()
 
 
-if cfg.step_nuke_graph:
+if cfg.step_nuke_graph and not cfg.transform_ingest:
     execute("Nuke graph", nuke_graph)
 
 
-def construct_graph():
+def create_indexes():
     driver = Driver()
-    driver.query("CREATE INDEX IF NOT EXISTS FOR (e:Event) ON (e.EventType)")
-    driver.query("CREATE INDEX IF NOT EXISTS FOR (e:Event) ON (e.Timestamp)")
-    driver.query("CREATE INDEX IF NOT EXISTS FOR (n:Entity) ON (n.EntityType)")
-    driver.query("CREATE INDEX IF NOT EXISTS FOR ()-[r:REL]-() ON (r.RelationType)")
-    driver.query("CREATE INDEX IF NOT EXISTS FOR ()-[c:CORR]-() ON (c.RelationType)")
+    for q in indexes:
+        driver.query(q)
+
+    advisor = Advisor()
+    advisor.add_pipeline()
+    advisor.report()
+
+    for q in advisor.statements():
+        driver.query(q)
+
+
+if cfg.step_create_indexes:
+    execute("Create indexes", create_indexes)
+
+
+def batch_size(data: DataFile, rows: int, concurrency: int) -> int:
+    """
+    Sizes the transactions of a file so that each takes about `load_transaction_seconds`, at the throughput measured
+    by loading its first rows in a transaction that is rolled back, while leaving every concurrent transaction a share
+    of the rows.
+    """
+    probe = min(rows, cfg.load_probe_rows)
+    if probe == 0:
+        return cfg.load_batch_min
+
+    seconds = Driver().probe(*data.probe_query(probe))
+    size = int(probe / max(seconds, 1e-3) * cfg.load_transaction_seconds)
+    size = min(size, -(-rows // concurrency))
+
+    return max(cfg.load_batch_min, min(cfg.load_batch_max, size))
+
+
+def load(data: DataFile):
+    """
+    Loads a file, in concurrent transactions if `load_node_concurrency` or `load_relation_concurrency` is set above
+    1, which needs Neo4j 5.21. Relation files that are loaded concurrently are merged, so a load that is aborted by a
+    deadlock between its transactions is run again.
+    """
+    construct = data.construct()
+    relation = isinstance(construct, Relation)
+    concurrency = (
+        cfg.load_relation_concurrency if relation else cfg.load_node_concurrency
+    )
+    retries = cfg.load_retries if relation and concurrency > 1 else 0
+
+    rows = data.rows()
+    size = batch_size(data, rows, concurrency)
+    logging.info(f"Loading {construct.file_name()} in transactions of {size} rows")
+
+    start = time.perf_counter()
+    for attempt in range(retries + 1):
+        try:
+            Driver().query(*data.query(size, concurrency))
+            break
+        except TransientError as e:
+            if attempt == retries:
+                raise
+            logging.warning(f"Retrying {construct.file_name()} after {e.code}")
+
+    count_throughput(construct.file_name(), rows, time.perf_counter() - start)
+
+
+def load_task(data: DataFile, nodes: list[str]) -> Task:
+    """
+    Returns the task that loads a file. A relation file is loaded once the files of its source and target are loaded,
+    and never at the same time as another relation file with the same source or target, as both would lock the same
+    nodes.
+    """
+    construct = data.construct()
+
+    if not isinstance(construct, Relation):
+        return Task(
+            construct.file_name(),
+            lambda: load(data),
+            outputs=[construct.file_name()],
+        )
+
+    endpoints = [construct.source().file_name(), construct.target().file_name()]
+    return Task(
+        construct.file_name(),
+        lambda *_: load(data),
+        inputs=[e for e in endpoints if e in nodes],
+        locks=endpoints,
+    )
 
-    for i in RelationIndexLoader():
-        for q in i.query():
-            driver.query(q)
 
-    for e in EventLoader():
-        driver.query(e.query())
+def construct_graph():
+    if cfg.transform_derive:
+        raise Exception("The derived files can only be loaded by the bulk import")
 
-    for e in EntityLoader():
-        driver.query(e.query())
+    data = [*EventLoader(), *EntityLoader()]
+    nodes = [d.construct().file_name() for d in data]
+    data += [*RelationLoader()]
 
-    for r in RelationLoader():
-        driver.query(r.query())
+    Scheduler([load_task(d, nodes) for d in data], cfg.construct_workers).run()
 
 
-if cfg.step_construct_graph:
+if cfg.step_construct_graph and not cfg.transform_ingest:
     execute("Load data", construct_graph)
 
 
+def reify_waves(rels: list[str]) -> list[list[str]]:
+    """
+    Groups the relations into waves that are reified one after another, while the relations in a wave are reified at
+    the same time. Reifying a relation moves the other relations of the entities it relates to their compound, so
+    from then on those entity types count as one. A relation joins the wave after the last relation before it that
+    shares an entity type with it. Relations without loaded files may relate any entity type.
+    """
+    endpoints = defaultdict(list)
+    for data in RelationLoader():
+        construct = data.construct()
+        if construct.source().type() == construct.target().type() == "Entity":
+            endpoints[construct.name()].append(
+                (construct.source().name(), construct.target().name())
+            )
+
+    groups = defaultdict(set)
+    touched = {}
+    waves = {}
+    for i, rel in enumerate(rels):
+        for source, target in endpoints.get(rel, []):
+            group = groups[source] | groups[target] | {source, target}
+            for entity in group:
+                groups[entity] = group
+
+        touched[rel] = set().union(
+            *[groups[entity] for pair in endpoints.get(rel, []) for entity in pair]
+        )
+
+        overlapping = [
+            waves[other]
+            for other in rels[:i]
+            if rel not in endpoints
+            or other not in endpoints
+            or touched[rel] & touched[other]
+        ]
+        waves[rel] = max(overlapping, default=-1) + 1
+
+    return [
+        [rel for rel in rels if waves[rel] == wave]
+        for wave in range(max(waves.values(), default=-1) + 1)
+    ]
+
+
+def batches(batched: query.Batched) -> list[query.Query]:
+    """
+    Collects the IDs of the elements to process and splits them into queries of `graph_batch_size` IDs each.
+    """
+    (ids_query, ids_parameters), (q, parameters) = batched
+    ids = Driver().query_df(ids_query, ids_parameters)["id"].to_list()
+
+    return [
+        (q, parameters | {"ids": ids[i : i + cfg.graph_batch_size]})
+        for i in range(0, len(ids), cfg.graph_batch_size)
+    ]
+
+
+def run_rounds(name: str, rounds: list[list[query.Query]]):
+    """
+    Runs rounds of independent queries one after the other, and logs the progress after every round.
+    """
+    for i, queries in enumerate(rounds):
+        query_all(queries)
+        logging.info(f"{name}: {i + 1} of {len(rounds)} rounds done")
+
+
+def run_batched(name: str, phases: list[query.Batched]):
+    """
+    Runs the phases of a batched query one after the other, and the batches of a phase `neo4j_concurrency` at a time.
+    """
+    step = cfg.neo4j_concurrency
+    for i, phase in enumerate(phases):
+        queries = batches(phase)
+        run_rounds(
+            f"{name} (phase {i + 1} of {len(phases)})",
+            [queries[j : j + step] for j in range(0, len(queries), step)],
+        )
+
+
 def reify_relations():
-    driver = Driver()
-    rels = ["PART_OF", "BOOKED_AS", "INVOICE_FOR", "PAYMENT_FOR", "RECEIPT_FOR"]
+    rels = query.reified
+
+    if cfg.graph_batch_size is not None:
+        for rel in rels:
+            run_batched(f"Reify {rel}", query.reify_batches(rel))
+        return
 
-    for rel in rels:
-        driver.query(query.reify(rel))
+    for wave in reify_waves(rels):
+        query_all([query.reify(rel) for rel in wave])
 
 
-if cfg.step_reify_relations:
+if cfg.step_reify_relations and not cfg.transform_derive:
     execute("Reify relations", reify_relations)
 
 
 def correlate_derived():
+    if cfg.graph_batch_size is not None:
+        run_batched("Correlate derived", query.correlate_derived_batches())
+        return
+
     driver = Driver()
-    driver.query(query.correlate_derived())
+    driver.query(*query.correlate_derived())
 
 
-if cfg.step_correlate_derived:
+if cfg.step_correlate_derived and not cfg.transform_derive:
     execute("Correlate derived entities to events", correlate_derived)
 
 
 def create_roots():
     driver = Driver()
-    driver.query(query.create_roots())
+    driver.query(*query.create_roots())
 
 
-if cfg.step_create_roots:
+if cfg.step_create_roots and not cfg.transform_derive:
     execute("Mark root entities", create_roots)
 
 
-def create_df():
-    driver = Driver()
-    driver.query(query.create_df())
+def stale_projections(
+    dfs: dict[str, tuple[str, ...]], built: dict[str, int]
+) -> dict[str, int]:
+    """
+    Returns the projections that have to be built, with the number of correlations of their events to roots. A
+    projection is current if its marker records as many correlations as there are now.
+    """
+    counts = query_all(
+        [query.projection_correlations(events) for events in dfs.values()], read=True
+    )
 
-    dfs = {}
-    for control in cfg.controls:
-        events = control.find_events()
-        dfs[hash(events)] = events
+    stale = {}
+    for id, result in zip(dfs, counts):
+        # an explained query returns no rows, in which case the projection is built
+        correlations = result[0]["correlations"] if result else None
+        if correlations is not None and built.get(id) == correlations:
+            logging.info(f"Skipping current projection {id} onto {dfs[id]}")
+        else:
+            stale[id] = correlations
 
-    for events in dfs.values():
-        driver.query(query.create_df(events))
+    return stale
 
 
-if cfg.step_create_df:
+def create_df():
+    dfs = {}
+    for control in cfg.controls:
+        events = control.find_events()
+        dfs[query.projection_id(events)] = events
+
+    built = {r["id"]: r["correlations"] for r in Driver().query(*query.projections())}
+    stale = stale_projections(dfs, built)
+    dfs = {id: events for id, events in dfs.items() if id in stale}
+    query_all(
+        [query.drop_projection(events) for id, events in dfs.items() if id in built]
+    )
+
+    if cfg.graph_batch_size is not None:
+        # the batches of a projection run one after the other, as concurrent merges could duplicate a relation
+        projections = [
+            batches(phase)
+            for batched in [
+                query.create_df_batches(),
+                *[query.create_df_batches(events) for events in dfs.values()],
+            ]
+            for phase in batched
+        ]
+        run_rounds(
+            "Create DF",
+            [[q for q in qs if q is not None] for qs in zip_longest(*projections)],
+        )
+    else:
+        query_all(
+            [query.create_df(), *[query.create_df(events) for events in dfs.values()]]
+        )
+
+    query_all([query.mark_projection(dfs[id], n) for id, n in stale.items()])
+
+
+if cfg.step_create_df and not cfg.transform_derive:
     execute("Create directly-follows paths", create_df)
 
 
 def check_controls():
-    driver = Driver()
-    for control in cfg.controls:
-        driver.query(control.check_query())
+    query_all([control.check_query() for control in cfg.controls])
 
 
 if cfg.step_check_controls:
@@ -100,8 +341,8 @@ if cfg.step_check_controls:
 
 def verify_construction():
     driver = Driver()
-    assert driver.query(query.verify_no_crossing_df_projections()) == []
-    assert driver.query(query.verify_violating_events_have_df_projection()) == []
+    assert driver.query(*query.verify_no_crossing_df_projections()) == []
+    assert driver.query(*query.verify_violating_events_have_df_projection()) == []
 
 
 if cfg.step_verify_construction:
@@ -111,6 +352,7 @@ if cfg.step_verify_construction:
 def remove_projections():
     driver = Driver()
     driver.query("MATCH ()-[p:DF_PROJECTION]-() DELETE p")
+    driver.query("MATCH (p:Projection) DELETE p")
 
 
 if cfg.step_remove_projections:
@@ -124,3 +366,7 @@ def set_identities():
 
 if cfg.step_set_identities:
     execute("Set identities", set_identities)
+
+
+Driver.report()
+report("construct")
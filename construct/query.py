@@ -1,14 +1,25 @@
-def reify(relation: str):
+import hashlib
+
+Query = tuple[str, dict]
+
+# relations that are reified into compound entities, in the order they are reified
+reified = ["PART_OF", "BOOKED_AS", "INVOICE_FOR", "PAYMENT_FOR", "RECEIPT_FOR"]
+
+# a query that returns the `id` of every element to process, and a query that processes the elements in `$ids`
+Batched = tuple[Query, Query]
+
+
+def reify(relation: str) -> Query:
     """
     Reifies a relation, lifting all relations that are connected to the original entities to the new entity.
     """
-    return f"""
-        MATCH (left:Entity)-[r:REL {{ RelationType: '{relation}' }}]->(right:Entity)
-        CREATE (left)<-[:REL {{ RelationType: 'REIFIED', Source: '{relation}' }}]-(compound:Entity {{
+    query = f"""
+        MATCH (left:Entity)-[r:REL {{ RelationType: $relation }}]->(right:Entity)
+        CREATE (left)<-[:REL {{ RelationType: 'REIFIED', Source: $relation }}]-(compound:Entity {{
                 ID: left.ID + '+' + right.ID,
                 EntityType: left.EntityType + '+' + right.EntityType,
                 Compound: true
-        }})-[:REL {{ RelationType: 'REIFIED', Source: '{relation}' }}]->(right)
+        }})-[:REL {{ RelationType: 'REIFIED', Source: $relation }}]->(right)
         DELETE r
         
         WITH compound
@@ -25,61 +36,238 @@ def reify(relation: str):
         DELETE r2
         """
 
+    return query, {"relation": relation}
+
+
+def reify_batches(relation: str) -> list[Batched]:
+    """
+    Reifies a relation in batches, in the three phases of `reify`. Every phase first collects the IDs of the
+    relations it processes, so that like in the single query, a phase never sees the relations that it creates itself.
+    """
+    reified = "RelationType: 'REIFIED'"
+
+    create = f"""
+        UNWIND $ids AS id
+        MATCH (left:Entity)-[r:REL]->(right:Entity)
+        WHERE elementId(r) = id
+        CREATE (left)<-[:REL {{ RelationType: 'REIFIED', Source: $relation }}]-(compound:Entity {{
+                ID: left.ID + '+' + right.ID,
+                EntityType: left.EntityType + '+' + right.EntityType,
+                Compound: true
+        }})-[:REL {{ RelationType: 'REIFIED', Source: $relation }}]->(right)
+        DELETE r
+        """
+
+    outgoing = f"""
+        UNWIND $ids AS id
+        MATCH (entity:Entity)-[r1:REL]->(target:Entity)
+        WHERE elementId(r1) = id
+        MATCH (compound)-[:REL {{ {reified}, Source: $relation }}]->(entity)
+        CREATE (compound)-[r1_copy:REL]->(target)
+        SET r1_copy = properties(r1)
+        DELETE r1
+        """
+
+    incoming = f"""
+        UNWIND $ids AS id
+        MATCH (source:Entity)-[r2:REL]->(entity:Entity)
+        WHERE elementId(r2) = id
+        MATCH (compound)-[:REL {{ {reified} }}]->(entity)
+        CREATE (compound)<-[r2_copy:REL]-(source)
+        SET r2_copy = properties(r2)
+        DELETE r2
+        """
+
+    return [
+        (
+            (
+                f"""
+                MATCH (:Entity)-[r:REL {{ RelationType: $relation }}]->(:Entity)
+                RETURN elementId(r) AS id
+                """,
+                {"relation": relation},
+            ),
+            (create, {"relation": relation}),
+        ),
+        (
+            (
+                f"""
+                MATCH (compound)-[:REL {{ {reified}, Source: $relation }}]->(:Entity)-[r1:REL]->(:Entity)
+                WHERE r1.RelationType <> 'REIFIED'
+                RETURN DISTINCT elementId(r1) AS id
+                """,
+                {"relation": relation},
+            ),
+            (outgoing, {"relation": relation}),
+        ),
+        (
+            (
+                f"""
+                MATCH (compound)-[:REL {{ {reified} }}]->(:Entity)<-[r2:REL]-(:Entity)
+                WHERE r2.RelationType <> 'REIFIED'
+                RETURN DISTINCT elementId(r2) AS id
+                """,
+                {},
+            ),
+            (incoming, {}),
+        ),
+    ]
+
 
-def correlate_derived():
+def correlate_derived() -> Query:
     """
     Correlates events to derived entities.
     """
-    return f"""
+    query = f"""
         MATCH (e:Event)-[:CORR]->(:Entity)<-[:REL* {{ RelationType: 'REIFIED' }}]-(n:Entity {{ Compound:true }})
         CREATE (e)-[:CORR]->(n)
         """
 
+    return query, {}
 
-def create_roots():
+
+def correlate_derived_batches() -> list[Batched]:
+    """
+    Correlates events to derived entities in batches of events. An event only gains relations of its own, so the
+    batches are independent.
+    """
+    query = f"""
+        UNWIND $ids AS id
+        MATCH (e:Event)
+        WHERE elementId(e) = id
+        MATCH (e)-[:CORR]->(:Entity)<-[:REL* {{ RelationType: 'REIFIED' }}]-(n:Entity {{ Compound:true }})
+        CREATE (e)-[:CORR]->(n)
+        """
+
+    return [(("MATCH (e:Event) RETURN elementId(e) AS id", {}), (query, {}))]
+
+
+def create_roots() -> Query:
     """
     Creates root entities.
     """
-    return f"""
+    query = f"""
         MATCH (n:Entity {{ Compound:true }}) 
         WHERE NOT (n)<-[:REL {{ RelationType: 'REIFIED' }}]-() 
               AND (n)-[:REL {{ RelationType: 'REIFIED' }}]->() 
         SET n:Entity:Root
     """
 
+    return query, {}
+
+
+def projection_id(events: tuple[str, ...]) -> str:
+    """
+    Returns the ID of the DF projection onto the given event types, a digest of the sorted types that is the same in
+    every run.
+    """
+    return hashlib.sha256(",".join(sorted(events)).encode()).hexdigest()[:16]
+
+
+def projections() -> Query:
+    """
+    Returns the markers of the built DF projections, with the number of correlations they were built from.
+    """
+    query = f"""
+        MATCH (p:Projection)
+        RETURN p.ID AS id, p.Correlations AS correlations
+    """
+
+    return query, {}
+
+
+def projection_correlations(events: tuple[str, ...]) -> Query:
+    """
+    Counts the correlations of the events of the given types to root entities, from which their projection is built.
+    """
+    query = f"""
+        MATCH (:Entity:Root)<-[:CORR]-(e:Event WHERE e.EventType IN $events)
+        RETURN count(e) AS correlations
+    """
+
+    return query, {"events": list(events)}
+
+
+def drop_projection(events: tuple[str, ...]) -> Query:
+    """
+    Deletes the DF projection onto the given event types, so that it can be built again.
+    """
+    query = f"""
+        MATCH ()-[df:DF_PROJECTION {{ ID: $id }}]->()
+        DELETE df
+    """
+
+    return query, {"id": projection_id(events)}
+
+
+def mark_projection(events: tuple[str, ...], correlations: int) -> Query:
+    """
+    Marks the DF projection onto the given event types as built from the given number of correlations.
+    """
+    query = f"""
+        MERGE (p:Projection {{ ID: $id }})
+        SET p.Events = $events, p.Correlations = $correlations
+    """
+
+    return query, {
+        "id": projection_id(events),
+        "events": list(events),
+        "correlations": correlations,
+    }
 
-def create_df(events: tuple[str, ...] = None):
+
+def create_df(events: tuple[str, ...] = None, batched: bool = False) -> Query:
     """
-    Finds the root entity and creates a DF relation between the correlated events.
+    Finds the root entity and creates a DF relation between the correlated events. If batched, only for the root
+    entities in `$ids`.
     """
-    return f"""
-        MATCH (n:Entity:Root),
-              (e:Event{" WHERE e.EventType IN ['" + "', '".join(events) + "']" if events else ""})-[:CORR]->(n)
+    parameters = {"events": list(events), "id": projection_id(events)} if events else {}
+
+    query = f"""
+        {"UNWIND $ids AS id" if batched else ""}
+        MATCH (n:Entity:Root{" WHERE elementId(n) = id" if batched else ""}),
+              (e:Event{" WHERE e.EventType IN $events" if events else ""})-[:CORR]->(n)
         WITH n, e ORDER BY e.Timestamp, ID(e)
         WITH n, collect(e) AS events
         UNWIND range(0, size(events)-2) AS i
         WITH events[i] as first, events[i+1] as second
-        MERGE (first)-[df:DF{f"_PROJECTION {{ ID: '{str(hash(events))}' }}" if events else ""}]->(second)    
+        MERGE (first)-[df:DF{"_PROJECTION { ID: $id }" if events else ""}]->(second)    
     """
 
+    return query, parameters
+
 
-def verify_no_crossing_df_projections():
+def create_df_batches(events: tuple[str, ...] = None) -> list[Batched]:
+    """
+    Creates the DF relations of `create_df` in batches of root entities.
+    """
+    return [
+        (
+            ("MATCH (n:Entity:Root) RETURN elementId(n) AS id", {}),
+            create_df(events, batched=True),
+        )
+    ]
+
+
+def verify_no_crossing_df_projections() -> Query:
     """
     Verifies that there are no df-projections between events with different root nodes
     """
-    return f"""
+    query = f"""
         MATCH (e1:Event)-[:DF_PROJECTION]-(e2:Event)
         WHERE (e1 <> e2) 
           AND NOT(EXISTS((e1)-[:CORR]->(:Entity:Root)<-[:CORR]-(e2)))
         RETURN *
     """
 
+    return query, {}
 
-def verify_violating_events_have_df_projection():
+
+def verify_violating_events_have_df_projection() -> Query:
     """
     Verifies that events that violate a control have a df-projection between them
     """
-    return f"""
+    query = f"""
         MATCH (c:Control),
               (c)<-[:VIOLATES]-(e1:Event),
               (c)<-[:VIOLATES]-(e2:Event),
@@ -88,3 +276,5 @@ def verify_violating_events_have_df_projection():
           AND NOT(EXISTS((e1)-[:DF_PROJECTION]-(e2)))
         RETURN *
     """
+
+    return query, {}
@@ -1,8 +1,18 @@
+import asyncio
 import logging
+import re
+import threading
+import time
+from collections import Counter
+from typing import Iterator
 
-from neo4j import GraphDatabase
+import polars as pl
+
+from neo4j import AsyncGraphDatabase, GraphDatabase
+from neo4j.time import Date, DateTime, Duration, Time
 
 import config as cfg
+from util import count_query
 
 
 class SystemDriver(object):
@@ -38,6 +48,8 @@ class SystemDriver(object):
 class Driver(object):
     _instance = None
     _driver = None
+    _plans = Counter()
+    _lock = threading.Lock()
 
     def __new__(cls):
         if cls._instance is None:
@@ -53,11 +65,266 @@ class Driver(object):
     def __del__(self):
         self._driver.close()
 
-    def query(self, query: str):
+    def query(self, query: str, parameters: dict = None):
         logging.info(f"Executing query: \n {query}")
+        if parameters:
+            logging.info(f"With parameters: {parameters}")
+
+        self._count(query)
+        start = time.perf_counter()
+        with self._driver.session() as session:
+            res = session.run(_profiled(query), parameters)
+            data = res.data()
+            _record(query, parameters, res.consume(), time.perf_counter() - start)
+
+            return data
+
+    def stream(self, query: str, parameters: dict = None) -> Iterator[pl.DataFrame]:
+        """
+        Runs a query and yields its result as frames of at most `neo4j_fetch_size` rows, fetching the next records only
+        when the next frame is requested, so that a large result never has to fit in memory at once.
+        """
+        logging.info(f"Streaming query: \n {query}")
+
+        self._count(query)
+        start = time.perf_counter()
+        with self._driver.session(fetch_size=cfg.neo4j_fetch_size) as session:
+            res = session.run(_profiled(query), parameters)
+            keys = res.keys()
+
+            rows, chunks = [], 0
+            for record in res:
+                rows.append(record.values())
+                if len(rows) == cfg.neo4j_fetch_size:
+                    yield _frame(keys, rows)
+                    rows, chunks = [], chunks + 1
+
+            if len(rows) > 0 or chunks == 0:
+                yield _frame(keys, rows)
+
+            _record(query, parameters, res.consume(), time.perf_counter() - start)
+
+    def query_df(self, query: str, parameters: dict = None) -> pl.DataFrame:
+        """
+        Runs a query and returns its result as a frame, which is built column by column from chunks of records.
+        """
+        return _concat(list(self.stream(query, parameters)))
+
+    def write(self, query: str, rows: list[dict], parameters: dict = None):
+        """
+        Runs a write query in a single transaction, which unwinds the given rows from the `$rows` parameter next to
+        the other parameters.
+        """
+        self._count(query)
+        start = time.perf_counter()
+        with self._driver.session() as session:
+            summary = session.execute_write(
+                lambda tx: tx.run(_profiled(query), parameters, rows=rows).consume()
+            )
+
+        # the rows themselves are left out, as they would put the whole batch in the log
+        _record(
+            query,
+            (parameters or {}) | {"rows": len(rows)},
+            summary,
+            time.perf_counter() - start,
+        )
 
+    def probe(self, query: str, parameters: dict = None) -> float:
+        """
+        Runs a write query in a transaction that is rolled back, and returns how many seconds it took.
+        """
+        self._count(query)
         with self._driver.session() as session:
-            res = session.run(query)
-            if res is not None:
-                return res.data()
-            return res
+            with session.begin_transaction() as tx:
+                start = time.perf_counter()
+                summary = tx.run(_profiled(query), parameters).consume()
+                seconds = time.perf_counter() - start
+                tx.rollback()
+
+        _record(query, parameters, summary, seconds)
+
+        return seconds
+
+    @classmethod
+    def _count(cls, query: str):
+        with cls._lock:
+            cls._plans[query] += 1
+
+    @classmethod
+    def report(cls):
+        """
+        Logs the share of queries whose text was sent before. Neo4j caches query plans by their text, so this is the
+        best case hit rate of its plan cache, and a low rate points to values that are built into the text.
+        """
+        total = sum(cls._plans.values())
+        if total == 0:
+            return
+
+        hits = total - len(cls._plans)
+        logging.info(
+            f"Plan cache: {hits} of {total} queries reused the text of an earlier query ({hits / total:.0%}), "
+            f"{len(cls._plans)} distinct texts"
+        )
+
+
+class AsyncDriver(object):
+    """
+    Runs queries on the asyncio API of the driver, of which at most `neo4j_concurrency` at the same time. Every query
+    runs in a managed transaction, which is retried when it deadlocks with another one.
+    """
+
+    def __init__(self):
+        self._driver = AsyncGraphDatabase.driver(cfg.neo4j_uri, auth=cfg.neo4j_auth)
+        self._semaphore = asyncio.Semaphore(cfg.neo4j_concurrency)
+
+    async def query(
+        self,
+        query: str,
+        parameters: dict = None,
+        read: bool = False,
+        frame: bool = False,
+    ) -> list[dict] | pl.DataFrame:
+        async def work(tx):
+            res = await tx.run(_profiled(query), parameters)
+            if not frame:
+                return await res.data(), await res.consume()
+
+            keys = await res.keys()
+            frames, rows = [], []
+            async for record in res:
+                rows.append(record.values())
+                if len(rows) == cfg.neo4j_fetch_size:
+                    frames.append(_frame(keys, rows))
+                    rows = []
+            if len(rows) > 0 or len(frames) == 0:
+                frames.append(_frame(keys, rows))
+
+            return _concat(frames), await res.consume()
+
+        async with self._semaphore:
+            logging.info(f"Executing query: \n {query}")
+            if parameters:
+                logging.info(f"With parameters: {parameters}")
+
+            Driver._count(query)
+            start = time.perf_counter()
+            async with self._driver.session(fetch_size=cfg.neo4j_fetch_size) as session:
+                if read:
+                    result, summary = await session.execute_read(work)
+                else:
+                    result, summary = await session.execute_write(work)
+
+            _record(query, parameters, summary, time.perf_counter() - start)
+
+            return result
+
+    async def close(self):
+        await self._driver.close()
+
+
+def query_all(
+    queries: list[tuple[str, dict]], read: bool = False, frames: bool = False
+) -> list[list[dict]] | list[pl.DataFrame]:
+    """
+    Runs independent queries concurrently and returns their results in the same order, as frames if `frames` is set.
+    """
+
+    async def run():
+        driver = AsyncDriver()
+        try:
+            return await asyncio.gather(
+                *[driver.query(q, p, read, frames) for q, p in queries]
+            )
+        finally:
+            await driver.close()
+
+    return asyncio.run(run())
+
+
+# statements that manage indexes, constraints and databases, which cannot be profiled
+schema_command = re.compile(
+    r"\s*(CREATE|DROP|SHOW)\s+(OR\s+REPLACE\s+)?(\w+\s+)?(INDEX|CONSTRAINT|DATABASE)",
+    re.IGNORECASE,
+)
+
+
+def _profiled(query: str) -> str:
+    """
+    Prefixes the query with `neo4j_profile`, which is PROFILE, EXPLAIN or None to run it as it is.
+    """
+    if cfg.neo4j_profile is None or schema_command.match(query):
+        return query
+
+    return f"{cfg.neo4j_profile} {query}"
+
+
+def _record(query: str, parameters: dict | None, summary, seconds: float):
+    """
+    Records how long a query took and what it changed, and the operators of its plan if it was profiled or explained.
+    """
+    entry = {
+        "seconds": seconds,
+        "available_after": summary.result_available_after,
+        "consumed_after": summary.result_consumed_after,
+        "counters": vars(summary.counters),
+        "query": query.strip(),
+        "parameters": parameters or {},
+    }
+
+    if summary.profile is not None:
+        entry["operators"] = _operators(summary.profile)
+        entry["db_hits"] = sum(op["db_hits"] or 0 for op in entry["operators"])
+        entry["rows"] = summary.profile.get("rows")
+    elif summary.plan is not None:
+        entry["operators"] = _operators(summary.plan)
+
+    count_query(entry)
+
+
+def _operators(plan: dict, depth: int = 0) -> list[dict]:
+    """
+    Flattens a plan into its operators depth first, with the rows and database hits of each if it was profiled.
+    """
+    operators = [
+        {
+            "operator": plan.get("operatorType"),
+            "depth": depth,
+            "rows": plan.get("rows"),
+            "db_hits": plan.get("dbHits"),
+            "details": plan.get("args", {}).get("Details"),
+        }
+    ]
+    for child in plan.get("children", []):
+        operators += _operators(child, depth + 1)
+
+    return operators
+
+
+def _frame(keys: list[str], rows: list[list]) -> pl.DataFrame:
+    """
+    Builds a frame from the values of a chunk of records column by column, converting temporal values to their
+    Python types.
+    """
+    columns = zip(*rows) if len(rows) > 0 else [[] for _ in keys]
+
+    return pl.DataFrame(
+        {key: [_native(value) for value in col] for key, col in zip(keys, columns)}
+    )
+
+
+def _native(value):
+    if isinstance(value, (Date, DateTime, Duration, Time)):
+        return value.to_native()
+
+    return value
+
+
+def _concat(frames: list[pl.DataFrame]) -> pl.DataFrame:
+    """
+    Concatenates the chunks of a result, widening the type of a column that is only null in the first chunks.
+    """
+    if len(frames) == 1:
+        return frames[0]
+
+    return pl.concat(frames, how="vertical_relaxed")
@@ -0,0 +1,66 @@
+import logging
+import sys
+from collections import Counter
+from pathlib import Path
+
+import polars as pl
+
+import config as cfg
+import sources
+from util import execute
+
+
+def generate_orders(first: int, last: int) -> dict[str, pl.DataFrame]:
+    """
+    Generates the rows of all sources that belong to the given range of orders. Nothing relates rows of different
+    orders, so the sources can be generated range by range.
+    """
+    df_orders = sources.orders(first, last)
+    df_receipts = sources.receipts(df_orders)
+    df_invoices = sources.invoices(df_orders)
+    df_payments = sources.payment_docs(df_invoices)
+
+    return {
+        "purchase_orders": sources.purchase_orders(df_orders),
+        "purchase_receipts": sources.purchase_receipts(df_receipts),
+        "purchase_invoices": sources.purchase_invoices(df_invoices),
+        "manual_exchange_rates": sources.manual_exchange_rates(df_invoices),
+        "payments": sources.payments(df_payments),
+        "linktable_purchases": sources.linktable_purchases(df_receipts, df_invoices),
+        "journals": sources.journals(df_receipts, df_invoices, df_payments),
+        "prom_p2p_changes": sources.changes(df_orders),
+    }
+
+
+def generate():
+    """
+    Writes the sources in chunks of `generate_chunk_orders` orders, which are appended to the files one after the
+    other, so that only a single chunk is ever held in memory.
+    """
+    path = Path(cfg.csv_import_dir)
+    path.mkdir(parents=True, exist_ok=True)
+
+    n = sources.order_count()
+    rows = Counter()
+    for first in range(0, n, cfg.generate_chunk_orders):
+        last = min(n, first + cfg.generate_chunk_orders)
+        for name, df in generate_orders(first, last).items():
+            with path.joinpath(f"{name}.csv").open("w" if first == 0 else "a") as f:
+                df.write_csv(f, separator=";", include_header=first == 0)
+            rows[name] += len(df)
+
+        logging.info(f"Generated orders {first} to {last} of {n}")
+
+    for name, count in rows.items():
+        logging.info(f"Wrote {count} rows to file {path.joinpath(f'{name}.csv')}")
+
+    file = path.joinpath("gl_master_data.csv")
+    sources.accounts.write_csv(file, separator=";")
+    logging.info(f"Wrote {len(sources.accounts)} rows to file {file}")
+
+    sources.activities.write_excel(cfg.activities_file, worksheet="Mapping")
+    logging.info(f"Wrote activities to file {cfg.activities_file}")
+
+
+execute("Generate", generate)
+sys.exit()
@@ -0,0 +1,532 @@
+from datetime import datetime
+
+import polars as pl
+
+import config as cfg
+
+start = datetime(2022, 1, 1)
+
+item_types = ["_Handelsartikelen", "_Diensten", "_Kantoorartikelen"]
+
+activities = pl.DataFrame(
+    {
+        "Activity": [
+            "Change price",
+            "Change quantity",
+            "Change delivery date",
+            "Change vendor",
+            "Change payment terms",
+        ],
+        "Tabdesc": ["Order line", "Order line", "Order line", "Order", "Order"],
+        "Table": ["EKPO", "EKPO", "EKET", "EKKO", "EKKO"],
+        "Field": ["NETPR", "MENGE", "EINDT", "LIFNR", "ZTERM"],
+    }
+)
+
+accounts = pl.DataFrame(
+    {
+        "%GL_ACC": [110000, 160000, 191100, 300000],
+        "GL Acc Desc": ["Bank", "Crediteuren", "Nog te ontvangen facturen", "Voorraad"],
+        "GL Acc Type": ["Balans", "Balans", "Balans", "Balans"],
+    }
+)
+
+
+def _random(*columns: str, seed: int) -> pl.Expr:
+    """
+    Deterministic uniform random number in [0, 1) per row, derived from the given key columns.
+    """
+    return (
+        pl.struct(columns).hash(cfg.generate_seed * 1_000 + seed) % 1_000_000
+    ) / 1_000_000
+
+
+def _pick(values: list[str], *columns: str, seed: int) -> pl.Expr:
+    return pl.lit(pl.Series(values)).gather(
+        (_random(*columns, seed=seed) * len(values)).cast(pl.UInt32)
+    )
+
+
+def _user(n: pl.Expr) -> pl.Expr:
+    return pl.format("USER{}", n.cast(pl.Utf8).str.zfill(4))
+
+
+def _other_user(user: str, *columns: str, seed: int) -> pl.Expr:
+    """
+    Picks the user of a follow-up step. With a probability of `generate_sod_conflict_rate` this is the same user as in
+    the given column, which violates segregation of duties.
+    """
+    users = _users()
+    shift = 1 + (_random(*columns, seed=seed + 1) * (users - 1)).cast(pl.Int64)
+
+    return (
+        pl.when(_random(*columns, seed=seed) < cfg.generate_sod_conflict_rate)
+        .then(pl.col(user))
+        .otherwise(_user((pl.col(user).str.slice(4).cast(pl.Int64) + shift) % users))
+    )
+
+
+def _users() -> int:
+    return max(10, round(20 * cfg.generate_scale))
+
+
+def _money(column: str) -> pl.Expr:
+    """
+    Formats an amount like `€ 1,234.56`.
+    """
+    cents = (pl.col(column) * 100).round().cast(pl.Int64)
+    units = (
+        (cents // 100)
+        .cast(pl.Utf8)
+        .str.reverse()
+        .str.extract_all(r"\d{1,3}")
+        .list.join(",")
+        .str.reverse()
+    )
+
+    return pl.format("€ {}.{}", units, (cents % 100).cast(pl.Utf8).str.zfill(2))
+
+
+def _date(column: str) -> pl.Expr:
+    return pl.col(column).dt.strftime("%d-%m-%Y")
+
+
+def _time(column: str) -> pl.Expr:
+    return pl.col(column).dt.strftime("%H:%M:%S")
+
+
+def _after(column: str, days: int, *columns: str, seed: int) -> pl.Expr:
+    return pl.col(column) + pl.duration(
+        seconds=(_random(*columns, seed=seed) * days * 24 * 3600).cast(pl.Int64)
+    )
+
+
+def order_count() -> int:
+    return max(1, round(1_000 * cfg.generate_scale))
+
+
+def orders(first: int, last: int) -> pl.DataFrame:
+    """
+    Generates one row per order line of the orders numbered from `first` up to `last`, which is the backbone of all
+    other sources. Every value is derived from the order and line numbers, so the orders are the same whichever range
+    they are generated in.
+    """
+    lines = 2 * cfg.generate_lines_per_order - 1
+
+    return (
+        pl.DataFrame({"order": pl.int_range(first, last, eager=True)})
+        .with_columns(
+            [
+                (pl.col("order") + 4_500_000_000).alias("PO No"),
+                _user((_random("order", seed=1) * _users()).cast(pl.Int64)).alias(
+                    "PO User"
+                ),
+                (
+                    pl.lit(start)
+                    + pl.duration(
+                        seconds=(_random("order", seed=2) * 365 * 24 * 3600).cast(
+                            pl.Int64
+                        )
+                    )
+                ).alias("po_date"),
+                pl.int_ranges(
+                    0, 1 + (_random("order", seed=3) * lines).cast(pl.Int64)
+                ).alias("line"),
+            ]
+        )
+        .explode("line")
+        .with_columns(
+            [
+                ((pl.col("line") + 1) * 10).alias("item"),
+                pl.col("po_date").dt.year().alias("year"),
+                _pick(item_types, "order", "line", seed=4).alias("PO Item Type"),
+                (1 + (_random("order", "line", seed=5) * 99).cast(pl.Int64)).alias(
+                    "#PO Quantity"
+                ),
+                (_random("order", "line", seed=6) * 5_000).round(2).alias("price"),
+            ]
+        )
+        .with_columns(
+            [
+                pl.format(
+                    "{}-{}-{}",
+                    pl.lit(cfg.company),
+                    pl.col("PO No"),
+                    pl.col("item").cast(pl.Utf8).str.zfill(6),
+                ).alias("%PO_LINE_NO"),
+                (_random("order", "line", seed=7) < 0.9).alias("received"),
+                (_random("order", "line", seed=8) < 0.85).alias("invoiced"),
+            ]
+        )
+    )
+
+
+def purchase_orders(df: pl.DataFrame) -> pl.DataFrame:
+    return df.select(
+        [
+            "PO No",
+            "%PO_LINE_NO",
+            _money("price").alias("#PO Price"),
+            "#PO Quantity",
+            _date("po_date").alias("PO Posting Date"),
+            "PO User",
+            "PO Item Type",
+        ]
+    )
+
+
+def receipts(df: pl.DataFrame) -> pl.DataFrame:
+    """
+    Generates one receipt per order for all received order lines.
+    """
+    return (
+        df.filter(pl.col("received"))
+        .with_columns(
+            [
+                (pl.col("order") + 5_000_000_000).alias("PR No"),
+                _after("po_date", 30, "order", seed=10).alias("pr_date"),
+                _other_user("PO User", "order", seed=11).alias("PR User"),
+                _pick(["Goods receipt", "Return delivery"], "order", seed=12).alias(
+                    "PR Receipt Type"
+                ),
+            ]
+        )
+        .with_columns(
+            [
+                pl.col("pr_date").dt.year().alias("PR Fiscal Year"),
+                pl.format(
+                    "{}-{}-{}-{}",
+                    pl.lit(cfg.company),
+                    pl.col("PR No"),
+                    pl.col("pr_date").dt.year(),
+                    pl.col("item").cast(pl.Utf8).str.zfill(4),
+                ).alias("%PR_LINE_NO"),
+                pl.format(
+                    "{}-{}-{}",
+                    pl.lit(cfg.company),
+                    pl.col("PR No"),
+                    pl.col("pr_date").dt.year(),
+                ).alias("pr_header"),
+            ]
+        )
+    )
+
+
+def purchase_receipts(df: pl.DataFrame) -> pl.DataFrame:
+    return df.select(
+        [
+            "%PR_LINE_NO",
+            pl.col("#PO Quantity").alias("#PR Quantity"),
+            pl.col("PO Item Type").alias("PR Item Type"),
+            "PR Receipt Type",
+            _date("pr_date").alias("PR Posting Date"),
+            "PR User",
+            pl.lit(cfg.company).alias("PR Company Code"),
+            "PR No",
+            "PR Fiscal Year",
+        ]
+    )
+
+
+def invoices(df: pl.DataFrame) -> pl.DataFrame:
+    """
+    Generates one invoice per order for all invoiced order lines.
+    """
+    return (
+        df.filter(pl.col("invoiced"))
+        .with_columns(
+            [
+                (pl.col("order") + 5_100_000_000).alias("PI No"),
+                _after("po_date", 60, "order", seed=20).alias("pi_date"),
+                _other_user("PO User", "order", seed=21).alias("PI User"),
+            ]
+        )
+        .with_columns(
+            [
+                pl.format(
+                    "{}-{}-{}",
+                    pl.lit(cfg.company),
+                    pl.col("PI No"),
+                    pl.col("pi_date").dt.year(),
+                ).alias("pi_header"),
+                pl.format(
+                    "{}-{}-{}-{}",
+                    pl.lit(cfg.company),
+                    pl.col("PI No"),
+                    pl.col("pi_date").dt.year(),
+                    pl.col("item").cast(pl.Utf8).str.zfill(6),
+                ).alias("%PI_LINE_NO"),
+                pl.format(
+                    "{}-{}-{}",
+                    pl.lit(cfg.company),
+                    pl.col("order") + 5_105_000_000,
+                    pl.col("pi_date").dt.year(),
+                ).alias("pi_doc"),
+            ]
+        )
+    )
+
+
+def purchase_invoices(df: pl.DataFrame) -> pl.DataFrame:
+    return df.select(
+        [
+            pl.when(_random("order", seed=22) < 0.05)
+            .then(pl.lit(None, pl.Utf8))
+            .otherwise(pl.col("pi_header"))
+            .alias("%PI_NO"),
+            "%PI_LINE_NO",
+            pl.col("price").alias("#PI Price"),
+            pl.col("#PO Quantity").alias("#PI Quantity"),
+            _date("pi_date").alias("PI Posting Date"),
+            "PI User",
+            "PI No",
+            pl.col("PO Item Type").alias("PI Item Type"),
+        ]
+    )
+
+
+def manual_exchange_rates(df: pl.DataFrame) -> pl.DataFrame:
+    return (
+        df.select(["order", "pi_header"])
+        .unique()
+        .select(
+            [
+                pl.col("pi_header").alias("PI_No"),
+                pl.when(_random("order", seed=23) < 0.8)
+                .then(pl.lit("1,0"))
+                .otherwise(
+                    pl.format(
+                        "0,{}",
+                        (8_000 + _random("order", seed=24) * 2_000)
+                        .cast(pl.Int64)
+                        .cast(pl.Utf8),
+                    )
+                )
+                .alias("Exchange_Rate"),
+            ]
+        )
+    )
+
+
+def payment_docs(df: pl.DataFrame) -> pl.DataFrame:
+    """
+    Generates one payment per invoice.
+    """
+    return (
+        df.group_by("order")
+        .agg(
+            [
+                pl.col("PI No").first(),
+                pl.col("PI User").first(),
+                pl.col("pi_date").first(),
+                (pl.col("price") * pl.col("#PO Quantity")).sum().alias("amount"),
+            ]
+        )
+        .with_columns(
+            [
+                (pl.col("order") + 1_500_000_000).alias("%BKPF"),
+                pl.format(
+                    "{}{}{}",
+                    pl.col("PI No"),
+                    pl.lit(cfg.company),
+                    pl.col("pi_date").dt.year(),
+                ).alias("%INVOICE"),
+                _after("pi_date", 30, "order", seed=30).alias("pay_date"),
+                _other_user("PI User", "order", seed=31).alias("Resource"),
+            ]
+        )
+        .with_columns(
+            pl.format(
+                "{}-{}-{}",
+                pl.lit(cfg.company),
+                pl.col("%BKPF"),
+                pl.col("pi_date").dt.year(),
+            ).alias("pay_doc")
+        )
+    )
+
+
+def payments(df: pl.DataFrame) -> pl.DataFrame:
+    return df.select(
+        [
+            "%BKPF",
+            "%INVOICE",
+            pl.when(_random("order", seed=32) < 0.9)
+            .then(pl.lit("Factuur bruto"))
+            .otherwise(pl.lit("Creditnota"))
+            .alias("Invoice type"),
+            pl.format("{} {}", _date("pay_date"), _time("pay_date")).alias("Timestamp"),
+            pl.lit("Invoice paid").alias("Activity"),
+            "Resource",
+        ]
+    )
+
+
+def linktable_purchases(
+    df_receipts: pl.DataFrame, df_invoices: pl.DataFrame
+) -> pl.DataFrame:
+    return (
+        df_receipts.select(["%PO_LINE_NO", "%PR_LINE_NO"])
+        .join(
+            df_invoices.select(["%PO_LINE_NO", "%PI_LINE_NO", "pi_doc"]),
+            on="%PO_LINE_NO",
+            how="outer_coalesce",
+        )
+        .select(
+            [
+                "%PR_LINE_NO",
+                "%PO_LINE_NO",
+                "%PI_LINE_NO",
+                pl.col("pi_doc").alias("%GL_DOC"),
+            ]
+        )
+    )
+
+
+def journals(
+    df_receipts: pl.DataFrame, df_invoices: pl.DataFrame, df_payments: pl.DataFrame
+) -> pl.DataFrame:
+    """
+    Generates a balanced journal entry for every receipt, invoice and payment.
+    """
+    amount = pl.col("price") * pl.col("#PO Quantity")
+
+    def entry(df: pl.DataFrame, doc, gl_pi, date, user, debit, credit, amount):
+        df = df.select(
+            [
+                doc.alias("%GL_DOC"),
+                gl_pi.alias("%GL_PI"),
+                amount.round(2).alias("amount"),
+                _date(date).alias("GL Entry Date"),
+                _date(date).alias("GL Effective Date"),
+                pl.col(user).alias("GL User"),
+            ]
+        )
+
+        return pl.concat(
+            [
+                df.with_columns(
+                    [
+                        pl.lit(debit).alias("%GL_ACC"),
+                        pl.lit(0.0).alias("#GL Credit"),
+                        pl.col("amount").alias("#GL Debit"),
+                    ]
+                ),
+                df.with_columns(
+                    [
+                        pl.lit(credit).alias("%GL_ACC"),
+                        pl.col("amount").alias("#GL Credit"),
+                        pl.lit(0.0).alias("#GL Debit"),
+                    ]
+                ),
+            ]
+        )
+
+    receipt_doc = pl.format(
+        "{}-{}-{}",
+        pl.lit(cfg.company),
+        pl.col("order") + 4_900_000_000,
+        pl.col("PR Fiscal Year"),
+    )
+
+    return pl.concat(
+        [
+            entry(
+                df_receipts,
+                receipt_doc,
+                pl.col("pr_header"),
+                "pr_date",
+                "PR User",
+                300000,
+                191100,
+                amount,
+            ),
+            entry(
+                df_invoices,
+                pl.col("pi_doc"),
+                pl.col("PI No").cast(pl.Utf8),
+                "pi_date",
+                "PI User",
+                191100,
+                160000,
+                amount,
+            ),
+            entry(
+                df_payments,
+                pl.col("pay_doc"),
+                pl.col("PI No").cast(pl.Utf8),
+                "pay_date",
+                "Resource",
+                160000,
+                110000,
+                pl.col("amount"),
+            ),
+        ]
+    ).select(
+        [
+            "%GL_DOC",
+            "%GL_ACC",
+            "#GL Credit",
+            "#GL Debit",
+            "GL Entry Date",
+            "GL Effective Date",
+            "GL User",
+            "%GL_PI",
+        ]
+    )
+
+
+def changes(df: pl.DataFrame) -> pl.DataFrame:
+    """
+    Generates the change log. The number of changes per order line follows a power law controlled by
+    `generate_trace_skew`, so that most lines have few changes and some have many. Changes to header fields are logged
+    with the key of the order instead of the order line, and a share of the changes is to fields that are not mapped
+    to an activity.
+    """
+    tables = [*activities["Table"], "EKPO", "EKKO"]
+    fields = [*activities["Field"], "LOEKZ", "FRGKE"]
+
+    n = (
+        pl.lit(cfg.generate_max_changes)
+        * _random("order", "line", seed=40).pow(cfg.generate_trace_skew)
+    ).cast(pl.Int64)
+
+    return (
+        df.with_columns(pl.int_ranges(0, n).alias("change"))
+        .explode("change")
+        .drop_nulls("change")
+        .with_columns(
+            [
+                _pick(tables, "order", "line", "change", seed=41).alias("CHG TABNAME"),
+                _pick(fields, "order", "line", "change", seed=41).alias("CHG FNAME"),
+                _after("po_date", 60, "order", "line", "change", seed=42).alias(
+                    "chg_date"
+                ),
+                _user(
+                    (_random("order", "line", "change", seed=43) * _users()).cast(
+                        pl.Int64
+                    )
+                ).alias("CHG USERNAME"),
+            ]
+        )
+        .select(
+            [
+                "CHG TABNAME",
+                "CHG FNAME",
+                _date("chg_date").alias("CHG UDATE"),
+                _time("chg_date").alias("CHG UTIME"),
+                pl.col("PO No").alias("CHG OBJECTID"),
+                "CHG USERNAME",
+                pl.when(pl.col("CHG TABNAME") == "EKKO")
+                .then(pl.format("100{}", pl.col("PO No")))
+                .otherwise(
+                    pl.format(
+                        "100{}{}",
+                        pl.col("PO No"),
+                        pl.col("item").cast(pl.Utf8).str.zfill(5),
+                    )
+                )
+                .alias("CHG TABKEY"),
+            ]
+        )
+    )
@@ -42,6 +42,9 @@ class GraphConstruct:
             )
 
             return Relation(relation_name, source, target)
+        elif file.name.startswith("DERIVED"):
+            result = re.search(r"DERIVED\((\w+)\)", file.name)
+            return Derived(result.group(1))
 
 
 class Event(GraphConstruct):
@@ -60,6 +63,18 @@ class Entity(GraphConstruct):
         return f"ENTITY({self.name()})"
 
 
+class Derived(GraphConstruct):
+    """
+    A file that the transform derives from the exported files, which refers to nodes by their file and row number.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+
+    def file_name(self) -> str:
+        return f"DERIVED({self.name()})"
+
+
 class Relation(GraphConstruct):
     def __init__(self, name: str, source: GraphConstruct, target: GraphConstruct):
         super().__init__(name)
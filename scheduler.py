@@ -0,0 +1,96 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+from typing import Any, Callable
+
+
+class Task:
+    """
+    A unit of work that consumes named inputs and produces named outputs. The inputs are passed to `f` as positional
+    arguments in the given order. When there are multiple outputs, `f` returns them as a tuple in the given order.
+    `sources` lists the files the task reads directly. Tasks that share one of their `locks` never run at the same time.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        f: Callable,
+        inputs: list[str] = None,
+        outputs: list[str] = None,
+        sources: list[Path] = None,
+        locks: list[str] = None,
+    ):
+        self.name = name
+        self.f = f
+        self.inputs = inputs or []
+        self.outputs = outputs or []
+        self.sources = sources or []
+        self.locks = locks or []
+
+    def run(self, values: dict[str, Any]) -> dict[str, Any]:
+        result = self.f(*[values[i] for i in self.inputs])
+
+        if len(self.outputs) == 0:
+            return {}
+        if len(self.outputs) == 1:
+            return {self.outputs[0]: result}
+
+        return dict(zip(self.outputs, result))
+
+
+class Scheduler:
+    """
+    Runs tasks on a thread pool as soon as all of their inputs are available.
+    """
+
+    def __init__(self, tasks: list[Task], workers: int = None):
+        self._tasks = tasks
+        self._workers = workers
+
+        producers = {}
+        for task in tasks:
+            for output in task.outputs:
+                assert output not in producers, f"{output} is produced twice"
+                producers[output] = task
+
+        for task in tasks:
+            for i in task.inputs:
+                assert i in producers, f"{i} is not produced by any task"
+
+    def run(
+        self, on_complete: Callable[[Task, dict[str, Any]], None] = None
+    ) -> dict[str, Any]:
+        """
+        Runs all tasks and returns all values they produced. `on_complete` is called from the scheduling thread with
+        the outputs of every task as soon as it finishes.
+        """
+        values = {}
+        pending = list(self._tasks)
+        running = {}
+        locked = set()
+
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            while pending or running:
+                for task in [t for t in pending if all(i in values for i in t.inputs)]:
+                    if any(lock in locked for lock in task.locks):
+                        continue
+
+                    logging.info(f"Task {task.name} started.")
+                    pending.remove(task)
+                    locked.update(task.locks)
+                    running[executor.submit(task.run, values.copy())] = task
+
+                assert running, f"Tasks {[t.name for t in pending]} can never run"
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    locked.difference_update(task.locks)
+                    outputs = future.result()
+                    logging.info(f"Task {task.name} ended.")
+
+                    values.update(outputs)
+                    if on_complete is not None:
+                        on_complete(task, outputs)
+
+        return values
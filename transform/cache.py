@@ -0,0 +1,82 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Callable
+
+import polars as pl
+
+import config as cfg
+from util import file_digest
+
+
+class Cache(object):
+    """
+    Keeps an Arrow IPC copy of every source file, so that it only has to be parsed once. The copy is uncompressed, so
+    it can be memory-mapped when it is read again. An entry is invalidated when the size or modification time of the
+    source changes. If `csv_cache_validation` is set to "hash", it is only invalidated when the content hash changes,
+    so that touching or copying a source does not convert it again.
+    """
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._path.mkdir(parents=True, exist_ok=True)
+
+    def get(
+        self, source: Path, key: str, options: str, read: Callable[[], pl.DataFrame]
+    ) -> Path:
+        """
+        Returns the IPC file for the source, converting it with `read` if the cache entry is missing or stale.
+        """
+        file = self._path.joinpath(f"{key}.arrow")
+        meta_file = self._path.joinpath(f"{key}.json")
+        meta = _meta(source, options)
+        cached = None
+        if file.exists() and meta_file.exists():
+            cached = json.loads(meta_file.read_text())
+
+        if cfg.csv_cache_validation == "hash":
+            meta["digest"] = _digest(source, meta, cached)
+            current = cached is not None and _content(cached) == _content(meta)
+        else:
+            current = cached == meta
+
+        if current:
+            logging.info(f"Using cached {file}")
+            meta_file.write_text(json.dumps(meta))
+            return file
+
+        logging.info(f"Converting {source} to {file}...")
+
+        tmp = file.with_suffix(".tmp")
+        read().write_ipc(tmp)
+        os.replace(tmp, file)
+        meta_file.write_text(json.dumps(meta))
+
+        return file
+
+
+def _meta(source: Path, options: str) -> dict:
+    stat = source.stat()
+    return {
+        "source": str(source),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+        "options": options,
+    }
+
+
+def _digest(source: Path, meta: dict, cached: dict | None) -> str:
+    """
+    Returns the content hash of the source. The modification time is only a pre-check: if neither it nor the size
+    changed, the hash of the cache entry is used instead of reading the whole file.
+    """
+    if cached is not None and "digest" in cached:
+        if all(cached.get(key) == value for key, value in meta.items()):
+            return cached["digest"]
+
+    return file_digest(source)
+
+
+def _content(meta: dict) -> dict:
+    return {key: value for key, value in meta.items() if key != "mtime"}
@@ -1,11 +1,13 @@
 import polars as pl
 
-from transform.loader import Loader
+from transform.loader import Loader, Frame
+
+columns = {"gl_master_data": ["%GL_ACC", "GL Acc Desc", "GL Acc Type"]}
 
 
 def load(
-    journal_entry_modified_relations: list[pl.DataFrame],
-) -> pl.DataFrame:
+    journal_entry_modified_relations: list[Frame],
+) -> Frame:
     loader = Loader()
 
     dfs = [df.select("to_ID").unique() for df in journal_entry_modified_relations]
@@ -13,7 +15,7 @@ def load(
     accounts = pl.concat(dfs).unique()
 
     account_descriptions = loader.get_df(
-        "gl_master_data", columns=["%GL_ACC", "GL Acc Desc", "GL Acc Type"]
+        "gl_master_data", columns=columns["gl_master_data"]
     )
 
     accounts = (
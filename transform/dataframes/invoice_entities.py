@@ -1,7 +1,9 @@
 import polars as pl
 
+from transform.loader import Frame
 
-def load(invoices: pl.DataFrame) -> tuple[pl.DataFrame, pl.DataFrame]:
+
+def load(invoices: Frame) -> tuple[Frame, Frame]:
     lines = (
         invoices.select(["PI_Line_No", "PI_No"]).unique().rename({"PI_Line_No": "ID"})
     )
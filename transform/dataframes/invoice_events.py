@@ -1,13 +1,10 @@
 import polars as pl
 
 import config as cfg
-from transform.loader import Loader
+from transform.loader import Loader, Frame
 
-
-def load() -> pl.DataFrame:
-    loader = Loader()
-
-    select = [
+columns = {
+    "purchase_invoices": [
         "%PI_NO",
         "%PI_LINE_NO",
         "#PI Price",
@@ -16,27 +13,30 @@ def load() -> pl.DataFrame:
         "PI User",
         "PI No",
         "PI Item Type",
-    ]
+    ],
+    "manual_exchange_rates": ["PI_No", "Exchange_Rate"],
+}
+
+
+def load() -> Frame:
+    loader = Loader()
 
     df = (
-        loader.get_df("purchase_invoices", columns=select)
+        loader.get_df("purchase_invoices", columns=columns["purchase_invoices"])
         .with_columns(
             [
-                pl.lit("Invoice line created").alias("Activity"),
+                pl.lit("Invoice line created").cast(pl.Categorical).alias("Activity"),
                 pl.col("%PI_NO").fill_null(
                     pl.concat_str(
                         [
                             pl.lit(cfg.company),
                             pl.col("PI No"),
-                            pl.col("PI Posting Date").str.split("-").list.get(2),
+                            pl.col("PI Posting Date").dt.year(),
                         ],
                         separator="-",
                     )
                 ),
-                (
-                    pl.col("PI Posting Date").str.strptime(pl.Datetime)
-                    + pl.duration(hours=2)
-                ).alias("Timestamp"),
+                (pl.col("PI Posting Date") + pl.duration(hours=2)).alias("Timestamp"),
             ]
         )
         .drop("PI No", "PI Posting Date")
@@ -53,14 +53,9 @@ def load() -> pl.DataFrame:
         .unique()
     )
 
-    df_exchange_rates = loader.get_df("manual_exchange_rates")
-    df = df.join(df_exchange_rates, on="PI_No", how="left").with_columns(
-        [
-            pl.col("Exchange_Rate")
-            .str.replace_all(",", ".")
-            .cast(pl.Float64)
-            .alias("Exchange_Rate")
-        ]
+    df_exchange_rates = loader.get_df(
+        "manual_exchange_rates", columns=columns["manual_exchange_rates"]
     )
+    df = df.join(df_exchange_rates, on="PI_No", how="left")
 
     return df
@@ -1,11 +1,13 @@
 import polars as pl
 
-from transform.loader import Loader
+from transform.loader import Loader, Frame
+
+columns = {"linktable_purchases": ["%PI_LINE_NO", "%PO_LINE_NO", "%GL_DOC"]}
 
 
 def load(
-    invoices: pl.DataFrame,
-) -> tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame, pl.DataFrame]:
+    invoices: Frame,
+) -> tuple[Frame, Frame, Frame, Frame]:
     loader = Loader()
 
     creation_of = (
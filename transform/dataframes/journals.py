@@ -1,61 +1,70 @@
-import itertools
-
 import polars as pl
 
-from transform.loader import Loader
+import config as cfg
+from transform.loader import Loader, Frame
+
+columns = {
+    "journals": [
+        "%GL_DOC",
+        "%GL_ACC",
+        "#GL Credit",
+        "#GL Debit",
+        "GL Entry Date",
+        "GL Effective Date",
+        "GL User",
+    ]
+}
 
-i = itertools.count()
 
+def load(booked_as: list[Frame], hours: list[int]) -> tuple[Frame, ...]:
+    """
+    Loads the journal entries booked by each of the given relations. The journal is filtered and aggregated for all
+    relations in a single pass, after which the result is split per relation. The entries of every relation are
+    timestamped the corresponding number of hours after their effective date.
 
-def load(booked_as: pl.DataFrame):
+    Returns the entry creation events, modified relations, entities and creation relations for every relation in turn.
+    """
     loader = Loader()
 
-    unique_docs = booked_as.select("to_ID").unique()
+    docs = pl.concat(
+        [
+            df.select("to_ID").unique().with_columns(pl.lit(i).alias("source"))
+            for i, df in enumerate(booked_as)
+        ]
+    )
 
     journals = (
-        loader.get_df(
-            "journals",
-            columns=[
-                "%GL_DOC",
-                "%GL_ACC",
-                "#GL Credit",
-                "#GL Debit",
-                "GL Entry Date",
-                "GL Effective Date",
-                "GL User",
-            ],
-        )
-        .filter(pl.col("%GL_DOC").is_in(unique_docs["to_ID"]))
+        loader.get_df("journals", columns=columns["journals"])
+        .join(docs, left_on="%GL_DOC", right_on="to_ID")
         .unique()
     )
 
+    if cfg.transform_streaming:
+        # the outputs are streamed one by one, so they read the booked lines back instead of scanning the journal
+        journals = loader.spill(journals, "journals")
+
+        # the streaming engine cannot run unique(subset=...)
+        entry_creations = journals.group_by(["source", "%GL_DOC"]).agg(
+            pl.col("GL Effective Date").first(), pl.col("GL User").first()
+        )
+    else:
+        entry_creations = journals.select(
+            ["source", "%GL_DOC", "GL Effective Date", "GL User"]
+        ).unique(subset=["source", "%GL_DOC"])
+
     entry_creations = (
-        journals.select(["%GL_DOC", "GL Effective Date", "GL User"])
-        .unique(subset="%GL_DOC")
-        .with_columns(
+        entry_creations.with_columns(
             [
-                pl.lit("Journal entry created").alias("Activity"),
-                (
-                    pl.col("GL Effective Date").str.strptime(pl.Datetime)
-                    + pl.duration(hours=21 + next(i))
-                ).alias("Timestamp"),
+                pl.lit("Journal entry created").cast(pl.Categorical).alias("Activity"),
+                pl.col("GL Effective Date").alias("Timestamp"),
             ]
         )
         .drop("GL Effective Date")
         .rename({"%GL_DOC": "GL_Doc", "GL User": "uID"})
     )
 
-    entities = entry_creations.select("GL_Doc").unique().rename({"GL_Doc": "ID"})
-
-    creation_of_relation = (
-        entities.with_columns(pl.col("ID").alias("to_ID"))
-        .rename({"ID": "from_GL_Doc"})
-        .unique()
-    )
-
     modified_relations = (
-        journals.select(["%GL_DOC", "%GL_ACC", "#GL Credit", "#GL Debit"])
-        .group_by(["%GL_DOC", "%GL_ACC"])
+        journals.group_by(["source", "%GL_DOC", "%GL_ACC"])
         .agg(pl.sum("#GL Credit"), pl.sum("#GL Debit"))
         .rename(
             {
@@ -67,4 +76,24 @@ def load(booked_as: pl.DataFrame):
         )
     )
 
-    return entry_creations, modified_relations, entities, creation_of_relation
+    dfs = []
+    for i, offset in enumerate(hours):
+        creations = (
+            entry_creations.filter(pl.col("source") == i)
+            .drop("source")
+            .with_columns(pl.col("Timestamp") + pl.duration(hours=offset))
+        )
+
+        entities = creations.select("GL_Doc").unique().rename({"GL_Doc": "ID"})
+
+        creation_of_relation = (
+            entities.with_columns(pl.col("ID").alias("to_ID"))
+            .rename({"ID": "from_GL_Doc"})
+            .unique()
+        )
+
+        modified = modified_relations.filter(pl.col("source") == i).drop("source")
+
+        dfs += [creations, modified, entities, creation_of_relation]
+
+    return tuple(dfs)
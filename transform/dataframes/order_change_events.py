@@ -3,17 +3,31 @@ from pathlib import Path
 import polars as pl
 
 import config as cfg
-from transform.loader import Loader
+from transform.loader import Loader, Frame
 
+columns = {
+    "prom_p2p_changes": [
+        "CHG TABNAME",
+        "CHG FNAME",
+        "CHG UDATE",
+        "CHG UTIME",
+        "CHG OBJECTID",
+        "CHG USERNAME",
+        "CHG TABKEY",
+    ]
+}
 
-def load() -> tuple[pl.DataFrame, pl.DataFrame]:
+
+def load() -> tuple[Frame, Frame]:
     loader = Loader()
 
-    df = loader.get_df("prom_p2p_changes")
+    df = loader.get_df("prom_p2p_changes", columns=columns["prom_p2p_changes"])
     activities = Path(cfg.activities_file)
 
-    df_activities = pl.read_excel(activities, sheet_name="Mapping").select(
-        ["Activity", "Tabdesc", "Table", "Field"]
+    df_activities = (
+        loader.get_excel(activities, sheet_name="Mapping")
+        .select(["Activity", "Tabdesc", "Table", "Field"])
+        .with_columns(pl.all().cast(pl.Categorical))
     )
 
     df = df.join(
@@ -23,11 +37,9 @@ def load() -> tuple[pl.DataFrame, pl.DataFrame]:
         how="left",
     ).filter(pl.col("Activity").is_not_null())
 
-    df_grouped = df.with_columns(
-        pl.concat_str([pl.col("CHG UDATE"), pl.col("CHG UTIME")], separator=" ")
-        .str.strptime(pl.Datetime)
-        .alias("Timestamp"),
-    ).partition_by("Tabdesc", as_dict=True)
+    df = df.with_columns(
+        pl.col("CHG UDATE").dt.combine(pl.col("CHG UTIME")).alias("Timestamp"),
+    )
 
     select = ["CHG OBJECTID", "CHG USERNAME", "Timestamp", "Activity"]
     rename = {
@@ -36,7 +48,7 @@ def load() -> tuple[pl.DataFrame, pl.DataFrame]:
     }
 
     df_lines = (
-        df_grouped["Order line"]
+        df.filter(pl.col("Tabdesc") == "Order line")
         .with_columns(
             pl.concat_str(
                 [
@@ -54,6 +66,8 @@ def load() -> tuple[pl.DataFrame, pl.DataFrame]:
         .unique()
     )
 
-    df_headers = df_grouped["Order"].select(select).rename(rename).unique()
+    df_headers = (
+        df.filter(pl.col("Tabdesc") == "Order").select(select).rename(rename).unique()
+    )
 
     return df_headers, df_lines
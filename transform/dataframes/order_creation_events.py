@@ -1,12 +1,9 @@
 import polars as pl
 
-from transform.loader import Loader
+from transform.loader import Loader, Frame
 
-
-def load() -> pl.DataFrame:
-    loader = Loader()
-
-    select = [
+columns = {
+    "purchase_orders": [
         "PO No",
         "%PO_LINE_NO",
         "#PO Price",
@@ -15,20 +12,19 @@ def load() -> pl.DataFrame:
         "PO User",
         "PO Item Type",
     ]
+}
+
+
+def load() -> Frame:
+    loader = Loader()
 
     df = (
-        loader.get_df("purchase_orders")
-        .select(select)
+        loader.get_df("purchase_orders", columns=columns["purchase_orders"])
+        .select(columns["purchase_orders"])
         .with_columns(
             [
-                pl.col("#PO Price")
-                .str.replace_all("€", "")
-                .str.replace_all(",", "")
-                .str.strip()
-                .cast(pl.Float64)
-                .alias("#PO Price"),
-                pl.lit("Order line created").alias("Activity"),
-                pl.col("PO Posting Date").str.strptime(pl.Datetime).alias("Timestamp"),
+                pl.lit("Order line created").cast(pl.Categorical).alias("Activity"),
+                pl.col("PO Posting Date").alias("Timestamp"),
             ]
         )
         .drop("PO Posting Date")
@@ -1,7 +1,9 @@
 import polars as pl
 
+from transform.loader import Frame
 
-def load(order_lines: pl.DataFrame) -> tuple[pl.DataFrame, pl.DataFrame]:
+
+def load(order_lines: Frame) -> tuple[Frame, Frame]:
     return (
         order_lines.select("PO_No").unique().rename({"PO_No": "ID"}),
         order_lines.select(["PO_Line_No", "PO_No"])
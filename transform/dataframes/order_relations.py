@@ -1,11 +1,13 @@
 import polars as pl
 
+from transform.loader import Frame
+
 
 def load(
-    header_changes: pl.DataFrame,
-    line_changes: pl.DataFrame,
-    line_creation: pl.DataFrame,
-) -> tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame, pl.DataFrame]:
+    header_changes: Frame,
+    line_changes: Frame,
+    line_creation: Frame,
+) -> tuple[Frame, Frame, Frame, Frame]:
     header_change_relation = (
         header_changes.select("PO_No")
         .with_columns(pl.col("PO_No").alias("to_ID"))
@@ -1,19 +1,28 @@
 import polars as pl
 
 import config as cfg
-from transform.loader import Loader
+from transform.loader import Loader, Frame
 
+columns = {
+    "payments": [
+        "%BKPF",
+        "%INVOICE",
+        "Invoice type",
+        "Timestamp",
+        "Activity",
+        "Resource",
+    ]
+}
 
-def load() -> (
-    tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame, pl.DataFrame, pl.DataFrame]
-):
+
+def load() -> tuple[Frame, Frame, Frame, Frame, Frame]:
     loader = Loader()
 
     payments = (
-        loader.get_df("payments", dtypes={"%INVOICE": pl.Utf8})
+        loader.get_df("payments", columns=columns["payments"])
         .drop_nulls(subset=["%BKPF", "%INVOICE"])
         .unique()
-        .filter(pl.col("Invoice type").str.contains("Factuur bruto"))
+        .filter(pl.col("Invoice type").cast(pl.Utf8).str.contains("Factuur bruto"))
         .with_columns(
             [
                 pl.concat_str(
@@ -24,17 +33,10 @@ def load() -> (
                     ],
                     separator="-",
                 ).alias("GL_Doc"),
-                pl.col("Timestamp")
-                .str.split_exact(" ", 1)
-                .struct.rename_fields(["Date", "Time"]),
             ]
         )
-        .unnest("Timestamp")
         .with_columns(
             [
-                pl.concat_str([pl.col("Date"), pl.col("Time")], separator=" ")
-                .str.strptime(pl.Datetime)
-                .alias("Timestamp"),
                 pl.when(pl.col("%INVOICE").str.contains(cfg.company))
                 .then(
                     pl.concat_str(
@@ -51,7 +53,7 @@ def load() -> (
                         [
                             pl.lit(cfg.company),
                             pl.col("%INVOICE").str.slice(0, 10),
-                            pl.col("Date").str.split("-").list.get(2),
+                            pl.col("Timestamp").dt.year(),
                         ],
                         separator="-",
                     )
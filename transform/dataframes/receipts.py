@@ -1,17 +1,33 @@
 import polars as pl
 
-from transform.loader import Loader
+from transform.loader import Loader, Frame
+
+columns = {
+    "purchase_receipts": [
+        "%PR_LINE_NO",
+        "#PR Quantity",
+        "PR Item Type",
+        "PR Receipt Type",
+        "PR Posting Date",
+        "PR User",
+        "PR Company Code",
+        "PR No",
+        "PR Fiscal Year",
+    ],
+    "linktable_purchases": ["%PR_LINE_NO", "%PO_LINE_NO", "%PI_LINE_NO"],
+    "journals": ["%GL_DOC", "%GL_PI"],
+}
 
 
 def load() -> (
     tuple[
-        pl.DataFrame,
-        pl.DataFrame,
-        pl.DataFrame,
-        pl.DataFrame,
-        pl.DataFrame,
-        pl.DataFrame,
-        pl.DataFrame,
+        Frame,
+        Frame,
+        Frame,
+        Frame,
+        Frame,
+        Frame,
+        Frame,
     ]
 ):
     loader = Loader()
@@ -36,12 +52,11 @@ def load() -> (
                             pl.lit("Purchase receipt created: "),
                             pl.col("PR Receipt Type"),
                         ]
-                    ).alias("Activity")
+                    )
+                    .cast(pl.Categorical)
+                    .alias("Activity")
                 ),
-                (
-                    pl.col("PR Posting Date").str.strptime(pl.Datetime)
-                    + pl.duration(hours=1)
-                ).alias("Timestamp"),
+                (pl.col("PR Posting Date") + pl.duration(hours=1)).alias("Timestamp"),
             ]
         )
         .drop("PR Posting Date")
@@ -98,7 +113,7 @@ def load() -> (
             "journals",
             columns=["%GL_DOC", "%GL_PI"],
         )
-        .filter(pl.col("%GL_PI").is_in(header_entities["ID"]))
+        .join(header_entities, left_on="%GL_PI", right_on="ID", how="semi")
         .rename({"%GL_PI": "from_ID", "%GL_DOC": "to_ID"})
         .unique()
     )
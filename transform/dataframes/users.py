@@ -1,9 +1,11 @@
 import polars as pl
 
+from transform.loader import Frame
+
 
 def load_entities(
-    events: list[pl.DataFrame],
-) -> pl.DataFrame:
+    events: list[Frame],
+) -> Frame:
     users_dfs = [df.select("uID").unique() for df in events]
 
     users = pl.concat(users_dfs).unique().rename({"uID": "ID"})
@@ -11,7 +13,7 @@ def load_entities(
     return users
 
 
-def load_relations(events: pl.DataFrame) -> pl.DataFrame:
+def load_relations(events: Frame) -> Frame:
     return (
         events.select("uID")
         .unique()
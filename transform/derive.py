@@ -0,0 +1,400 @@
+import logging
+from pathlib import Path
+
+import polars as pl
+
+import config as cfg
+from construct.query import projection_id, reified
+from graph_construct import Derived, Entity, Event, GraphConstruct, Relation
+from saver import Saver
+
+compound = Derived("compound")
+
+
+def derive():
+    """
+    Computes the compound entities, root entities, derived correlations and directly-follows relations that `reify`,
+    `create_roots`, `correlate_derived` and `create_df` create in the graph, from the exported files, and writes them
+    to DERIVED files for the bulk import. Nodes are referred to by the file they are in and their row number in it,
+    like the bulk import numbers them.
+
+    A relation that is reified creates a compound for every relation, not for every connected component, as an entity
+    that takes part in several relations, such as a header with many lines, ends up in several compounds. The
+    reification is therefore replayed over tables of relations, phase by phase like the query runs, with every phase
+    reading the relations as they were before it.
+    """
+    path = Path(cfg.transform_export_dir)
+    saver = Saver()
+
+    nodes = _nodes(path)
+    relations, correlations = _relations(path, nodes)
+    components = pl.DataFrame(
+        schema={"parent": pl.Int64, "child": pl.Int64, "Source": pl.Utf8}
+    )
+
+    for relation in reified:
+        nodes, relations, components = _reify(relation, nodes, relations, components)
+
+    compounds = (
+        nodes.filter(pl.col("File") == compound.file_name())
+        .sort("Row")
+        .select(
+            [
+                pl.col("Row").alias("Key"),
+                "ID",
+                "EntityType",
+                pl.col("node").is_in(components["child"]).not_().alias("Root"),
+            ]
+        )
+    )
+
+    logging.info(
+        f"Derived {len(compounds)} compound entities, of which {compounds['Root'].sum()} roots"
+    )
+
+    saver.save_df(compounds, compound)
+    saver.save_df(
+        _refer(components, nodes, "parent", "from").select(
+            ["from_Row", "to_File", "to_Row", "Source"]
+        ),
+        Derived("reified"),
+    )
+    saver.save_df(_refer(relations, nodes, "src", "from"), Derived("rel"))
+    correlations = _correlate(correlations, components, nodes)
+    saver.save_df(correlations, Derived("corr"))
+
+    df, projections, markers = _directly_follows(path, correlations, compounds)
+    saver.save_df(df, Derived("df"))
+    saver.save_df(projections, Derived("df_projection"))
+    saver.save_df(markers, Derived("projection"))
+
+
+def _nodes(path: Path) -> pl.DataFrame:
+    """
+    Numbers the entities of all entity files.
+    """
+    dfs = []
+    for file in sorted(path.glob("ENTITY*.csv")):
+        construct = GraphConstruct.parse(file)
+        dfs.append(
+            _scan(file).select(
+                [
+                    pl.lit(construct.file_name()).alias("File"),
+                    "Row",
+                    "ID",
+                    pl.lit(construct.name()).alias("EntityType"),
+                ]
+            )
+        )
+
+    return (
+        pl.concat(pl.collect_all(dfs))
+        .with_row_count("node")
+        .with_columns(pl.col("node").cast(pl.Int64), pl.col("Row").cast(pl.Int64))
+    )
+
+
+def _relations(path: Path, nodes: pl.DataFrame) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """
+    Returns the relations between entities, and the correlations of events to entities, which the bulk import would
+    create from the relation files by joining them to the rows of the node files on their key columns.
+    """
+    relations, correlations = [], []
+    for file in sorted(path.glob("RELATION*.csv")):
+        construct = GraphConstruct.parse(file)
+        assert isinstance(construct, Relation)
+
+        source, target = construct.source(), construct.target()
+        if not all(
+            path.joinpath(f"{n.file_name()}.csv").exists() for n in [source, target]
+        ):
+            continue
+
+        df = _scan(file)
+        src_col = [col for col in df.columns if col.startswith("from_")][0]
+        tgt_col = [col for col in df.columns if col.startswith("to_")][0]
+
+        df = df.join(
+            _keys(path, source, src_col.replace("from_", ""), "source"),
+            left_on=src_col,
+            right_on="key",
+        ).join(
+            _keys(path, target, tgt_col.replace("to_", ""), "target"),
+            left_on=tgt_col,
+            right_on="key",
+        )
+
+        if isinstance(source, Entity) and isinstance(target, Entity):
+            relations.append(
+                _node(_node(df, nodes, source, "source"), nodes, target, "target")
+                .select(
+                    [
+                        pl.col("source").alias("src"),
+                        pl.col("target").alias("tgt"),
+                        pl.lit(construct.name()).alias("RelationType"),
+                    ]
+                )
+                .collect()
+            )
+        elif isinstance(source, Event) != isinstance(target, Event):
+            event, entity = ("source", "target")
+            if isinstance(target, Event):
+                event, entity = entity, event
+            node = target if entity == "target" else source
+            events = source if event == "source" else target
+
+            correlations.append(
+                _node(df, nodes, node, entity)
+                .select(
+                    [
+                        pl.lit(events.file_name()).alias("File"),
+                        pl.col(event).alias("Row"),
+                        pl.col(entity).alias("node"),
+                    ]
+                )
+                .collect()
+            )
+
+    return pl.concat(relations), pl.concat(correlations)
+
+
+def _reify(
+    relation: str,
+    nodes: pl.DataFrame,
+    relations: pl.DataFrame,
+    components: pl.DataFrame,
+) -> tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame]:
+    """
+    Replays `reify` of a relation. First, every relation gets a compound of its source and target, and is removed.
+    Then the relations of the components of the new compounds are moved to the compounds, and finally the relations
+    into any component are moved to its compounds.
+    """
+    reify = relations.filter(pl.col("RelationType") == relation)
+    relations = relations.filter(pl.col("RelationType") != relation)
+
+    first = nodes.filter(pl.col("File") == compound.file_name()).height
+    new = (
+        reify.join(
+            nodes.select(["node", "ID", "EntityType"]), left_on="src", right_on="node"
+        )
+        .join(
+            nodes.select(["node", "ID", "EntityType"]),
+            left_on="tgt",
+            right_on="node",
+            suffix="_tgt",
+        )
+        .with_row_count("Row")
+        .select(
+            [
+                (pl.col("Row").cast(pl.Int64) + nodes.height).alias("node"),
+                pl.lit(compound.file_name()).alias("File"),
+                (pl.col("Row").cast(pl.Int64) + first).alias("Row"),
+                pl.concat_str(["ID", pl.lit("+"), "ID_tgt"]).alias("ID"),
+                pl.concat_str(["EntityType", pl.lit("+"), "EntityType_tgt"]).alias(
+                    "EntityType"
+                ),
+                "src",
+                "tgt",
+            ]
+        )
+    )
+
+    nodes = pl.concat([nodes, new.select(nodes.columns)])
+    reified_now = pl.concat(
+        [
+            new.select([pl.col("node").alias("parent"), pl.col(end).alias("child")])
+            for end in ["src", "tgt"]
+        ]
+    ).with_columns(pl.lit(relation).alias("Source"))
+    components = pl.concat([components, reified_now])
+
+    relations = _move(relations, reified_now, "src")
+    relations = _move(relations, components, "tgt")
+
+    logging.info(f"Reified {len(new)} {relation} relations")
+
+    return nodes, relations, components
+
+
+def _move(relations: pl.DataFrame, components: pl.DataFrame, end: str) -> pl.DataFrame:
+    """
+    Moves the end of every relation that is at a component to each of its compounds.
+    """
+    relations = relations.with_row_count("relation")
+    moved = relations.join(components, left_on=end, right_on="child").with_columns(
+        pl.col("parent").alias(end)
+    )
+
+    return pl.concat(
+        [
+            relations.filter(pl.col("relation").is_in(moved["relation"]).not_()),
+            moved.select(relations.columns),
+        ]
+    ).drop("relation")
+
+
+def _correlate(
+    correlations: pl.DataFrame, components: pl.DataFrame, nodes: pl.DataFrame
+) -> pl.DataFrame:
+    """
+    Replays `correlate_derived`, which correlates every event to all compounds above its entities, once for every path
+    to a compound.
+    """
+    ancestors = []
+    level = correlations
+    while len(level) > 0:
+        level = level.join(components, left_on="node", right_on="child").select(
+            ["File", "Row", pl.col("parent").alias("node")]
+        )
+        ancestors.append(level)
+
+    return (
+        pl.concat(ancestors)
+        .join(nodes.select(["node", pl.col("Row").alias("to_Row")]), on="node")
+        .select(
+            [
+                pl.col("File").alias("from_File"),
+                pl.col("Row").alias("from_Row"),
+                "to_Row",
+            ]
+        )
+    )
+
+
+def _directly_follows(
+    path: Path, correlations: pl.DataFrame, compounds: pl.DataFrame
+) -> tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame]:
+    """
+    Replays `create_df` for the full DF and the projection onto the events of every control, from a single sort of
+    the events of every root by their timestamp. Ties are broken by file and row, which is the order in which the bulk
+    import numbers the events. An event is in a trace once for every correlation to its root, like `collect` sees it,
+    and relations that are merged more than once are created once. Also returns the markers of the projections, with
+    the number of correlations they were built from.
+    """
+    roots = compounds.filter(pl.col("Root")).select(pl.col("Key").alias("root"))
+    traces = correlations.join(roots, left_on="to_Row", right_on="root").select(
+        [
+            pl.col("from_File").alias("File"),
+            pl.col("from_Row").alias("Row"),
+            pl.col("to_Row").alias("root"),
+        ]
+    )
+
+    events = []
+    for file in sorted(path.glob("EVENT*.csv")):
+        construct = GraphConstruct.parse(file)
+        events.append(
+            _scan(file).select(
+                [
+                    pl.lit(construct.file_name()).alias("File"),
+                    pl.col("Row").cast(pl.Int64),
+                    pl.lit(construct.name()).alias("EventType"),
+                    pl.col("Timestamp").str.to_datetime(strict=False),
+                ]
+            )
+        )
+
+    traces = traces.join(pl.concat(pl.collect_all(events)), on=["File", "Row"]).sort(
+        ["root", "Timestamp", "File", "Row"], nulls_last=True
+    )
+
+    projections = {}
+    for control in cfg.controls:
+        events = control.find_events()
+        projections[projection_id(events)] = events
+
+    df = _follows(traces)
+
+    markers = pl.DataFrame(
+        {
+            "ID": list(projections),
+            "Correlations": [
+                traces.filter(pl.col("EventType").is_in(events)).height
+                for events in projections.values()
+            ],
+        }
+    )
+    projections = pl.concat(
+        [
+            _follows(traces.filter(pl.col("EventType").is_in(events))).with_columns(
+                pl.lit(id).alias("ID")
+            )
+            for id, events in projections.items()
+        ]
+    )
+
+    logging.info(
+        f"Derived {len(df)} DF relations and {len(projections)} DF_PROJECTION relations"
+    )
+
+    return df, projections, markers
+
+
+def _follows(traces: pl.DataFrame) -> pl.DataFrame:
+    """
+    Relates every event of a sorted trace to the next one.
+    """
+    return (
+        traces.select(
+            [
+                pl.col("File").alias("from_File"),
+                pl.col("Row").alias("from_Row"),
+                pl.col("File").shift(-1).over("root").alias("to_File"),
+                pl.col("Row").shift(-1).over("root").alias("to_Row"),
+            ]
+        )
+        .drop_nulls("to_Row")
+        .unique(maintain_order=True)
+    )
+
+
+def _refer(
+    relations: pl.DataFrame, nodes: pl.DataFrame, source: str, prefix: str
+) -> pl.DataFrame:
+    """
+    Replaces the node numbers of the ends of relations by the file and row of the node.
+    """
+    target = "tgt" if source == "src" else "child"
+    refs = nodes.select(["node", "File", "Row"])
+
+    return (
+        relations.join(refs, left_on=source, right_on="node")
+        .join(refs, left_on=target, right_on="node", suffix="_to")
+        .rename(
+            {
+                "File": f"{prefix}_File",
+                "Row": f"{prefix}_Row",
+                "File_to": "to_File",
+                "Row_to": "to_Row",
+            }
+        )
+        .drop([source, target])
+    )
+
+
+def _node(
+    df: pl.LazyFrame, nodes: pl.DataFrame, construct: GraphConstruct, col: str
+) -> pl.LazyFrame:
+    """
+    Replaces the row number of an entity in its file by its node number.
+    """
+    refs = nodes.lazy().filter(pl.col("File") == construct.file_name())
+
+    return (
+        df.join(refs.select(["Row", "node"]), left_on=col, right_on="Row")
+        .with_columns(pl.col("node").alias(col))
+        .drop("node")
+    )
+
+
+def _keys(path: Path, construct: GraphConstruct, key: str, alias: str) -> pl.LazyFrame:
+    return _scan(path.joinpath(f"{construct.file_name()}.csv")).select(
+        [pl.col("Row").cast(pl.Int64).alias(alias), pl.col(key).alias("key")]
+    )
+
+
+def _scan(file: Path) -> pl.LazyFrame:
+    """
+    Scans a file with all columns as strings and numbers its rows, like the bulk import does.
+    """
+    return pl.scan_csv(file, separator=";", infer_schema_length=0, row_count_name="Row")
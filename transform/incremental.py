@@ -0,0 +1,84 @@
+import hashlib
+import logging
+from pathlib import Path
+
+import config as cfg
+from graph_construct import GraphConstruct
+from saver import Saver
+from scheduler import Task
+
+root = Path(__file__).parent.parent
+
+
+def plan(
+    tasks: list[Task], saves: dict[str, GraphConstruct]
+) -> tuple[list[Task], dict[str, dict]]:
+    """
+    Determines which tasks have to run again. The outputs of a task are current if the manifest of the Saver records
+    that they were written by the same version of the transform code, from source files with the same content as
+    all the sources the task depends on, directly or through its inputs.
+
+    Returns the tasks to run, in which current tasks whose outputs are still needed are replaced by tasks that read
+    their files back, and the stamps to save the outputs of the remaining tasks with.
+    """
+    saver = Saver()
+    version = _version()
+    producers = {output: task for task in tasks for output in task.outputs}
+    sources = {}
+
+    def task_sources(task: Task) -> dict[str, str]:
+        if task.name not in sources:
+            sources[task.name] = {str(f): saver.digest(Path(f)) for f in task.sources}
+            for i in task.inputs:
+                sources[task.name] |= task_sources(producers[i])
+
+        return sources[task.name]
+
+    stamps = {}
+    for task in tasks:
+        stamp = {"sources": task_sources(task), "version": version}
+        if not all(saver.is_current(saves[o], stamp) for o in task.outputs):
+            stamps |= {output: stamp for output in task.outputs}
+
+    needed = {i for task in tasks if task.outputs[0] in stamps for i in task.inputs}
+
+    result = []
+    for task in tasks:
+        if task.outputs[0] in stamps:
+            result.append(task)
+        elif any(output in needed for output in task.outputs):
+            result.append(_read_back(task, saves))
+
+    skipped = [saves[o].file_name() for o in producers if o not in stamps]
+    if len(skipped) > 0:
+        logging.info(
+            f"Skipping {len(skipped)} unchanged outputs:\n"
+            + "\n".join([f"- {f}" for f in skipped])
+        )
+
+    return result, stamps
+
+
+def _read_back(task: Task, saves: dict[str, GraphConstruct]) -> Task:
+    def read():
+        dfs = tuple(Saver().load_df(saves[output]) for output in task.outputs)
+        return dfs if len(dfs) > 1 else dfs[0]
+
+    return Task(f"{task.name} (unchanged)", read, outputs=task.outputs)
+
+
+def _version() -> str:
+    """
+    Hashes the code of the transform and the configuration it depends on.
+    """
+    digest = hashlib.sha256(cfg.company.encode())
+
+    files = [
+        *sorted(root.joinpath("transform").rglob("*.py")),
+        root.joinpath("graph_construct.py"),
+        root.joinpath("scheduler.py"),
+    ]
+    for file in files:
+        digest.update(file.read_bytes())
+
+    return digest.hexdigest()
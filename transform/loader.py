@@ -1,16 +1,31 @@
 import logging
 import os
+import tempfile
+import threading
+from collections import Counter, defaultdict
 from pathlib import Path
 
 import polars as pl
 
 import config as cfg
+from transform.cache import Cache
+from transform.schema import parse, read_dtypes, sources
+
+Frame = pl.DataFrame | pl.LazyFrame
 
 
 class Loader(object):
     _instance = None
     _csvs = None
     _dfs = None
+    _complete = None
+    _columns = None
+    _hits = None
+    _misses = None
+    _cache = None
+    _locks = None
+    _spills = None
+    _lock = threading.Lock()
 
     def __new__(cls):
         if cls._instance is None:
@@ -25,37 +40,274 @@ class Loader(object):
             )
 
             cls._dfs = {}
+            cls._complete = set()
+            cls._columns = {}
+            cls._hits = Counter()
+            cls._misses = Counter()
+            cls._locks = defaultdict(threading.Lock)
+            cls._spills = []
+
+            if cfg.csv_cache_dir is not None:
+                cls._cache = Cache(Path(cfg.csv_cache_dir))
 
         return cls._instance
 
+    def require(self, columns: dict[str, list[str] | None]):
+        """
+        Registers the columns a consumer will request per file, where `None` means all columns. The first request for a
+        file then reads the union of the registered columns, and all requests are served from that single read.
+        """
+        for name, cols in columns.items():
+            if cols is None or self._columns.get(name, []) is None:
+                self._columns[name] = None
+            else:
+                registered = self._columns.get(name, [])
+                self._columns[name] = registered + [
+                    col for col in cols if col not in registered
+                ]
+
+    def path(self, name: str) -> Path:
+        if name in self._csvs:
+            return self._csvs[name]
+
+        raise Exception(f"Could not find file {name}.csv")
+
+    def header(self, name: str) -> list[str]:
+        return pl.read_csv(self.path(name), separator=";", n_rows=0).columns
+
+    def row_size(self, name: str) -> int:
+        """
+        Estimates the average number of bytes per row of a file from its first lines.
+        """
+        with open(self.path(name), "rb") as f:
+            lines = f.readlines(1_000_000)[1:]
+
+        return max(1, sum(len(line) for line in lines) // max(1, len(lines)))
+
     def get_df(
         self,
         name: str,
         schema: dict[str, pl.DataType | pl.PolarsDataType] = None,
         dtypes: dict[str, pl.DataType | pl.PolarsDataType] = None,
         columns: list[str] = None,
-    ) -> pl.DataFrame:
+    ) -> Frame:
         if name in self._csvs:
-            if name not in self._dfs:
-                if columns is not None:
-                    logging.info(f"Loading {name} with columns {columns}...")
+            dtypes = read_dtypes(name, self.header(name)) | (dtypes or {})
+
+            with self._file_lock(name):
+                return self._get_df(name, schema, dtypes, columns)
+
+        raise Exception(f"Could not find file {name}.csv")
+
+    def _file_lock(self, name: str) -> threading.Lock:
+        """
+        Returns the lock that serializes reads of a file, so that tasks running in parallel never parse it twice.
+        """
+        with self._lock:
+            return self._locks[name]
+
+    def _get_df(
+        self,
+        name: str,
+        schema: dict[str, pl.DataType | pl.PolarsDataType] = None,
+        dtypes: dict[str, pl.DataType | pl.PolarsDataType] = None,
+        columns: list[str] = None,
+    ) -> Frame:
+        if cfg.transform_lazy:
+            return self._scan_df(name, schema, dtypes, columns)
+
+        if name in self._dfs and self._covers(name, columns):
+            self._hits[name] += 1
+        else:
+            read = self._columns.get(name, columns)
+            if name in self._dfs:
+                read = self._dfs[name].columns
+                logging.warning(
+                    f"Columns {columns} of {name} were not registered, reading it again..."
+                )
+            read = _union(read, columns)
+
+            if read is not None:
+                logging.info(f"Loading {name} with columns {read}...")
+            else:
+                logging.info(f"Loading {name}...")
+
+            self._misses[name] += 1
+            self._dfs[name] = self._read_csv(name, schema, dtypes, read)
+            if read is None:
+                self._complete.add(name)
+
+        return _select(self._dfs[name], columns)
+
+    def _covers(self, name: str, columns: list[str] | None) -> bool:
+        if name in self._complete:
+            return True
+
+        if columns is None:
+            return False
+
+        return all(col in self._dfs[name].columns for col in columns)
+
+    def _scan_df(
+        self,
+        name: str,
+        schema: dict[str, pl.DataType | pl.PolarsDataType] = None,
+        dtypes: dict[str, pl.DataType | pl.PolarsDataType] = None,
+        columns: list[str] = None,
+    ) -> pl.LazyFrame:
+        """
+        Returns a lazy scan of the file. Every consumer of the same file shares a single scan, so that projections
+        and filters are pushed into it and the common subplan is only executed once when collecting. The streaming
+        engine cannot read IPC files, so in streaming mode the CSV is always scanned directly.
+        """
+        if name in self._dfs:
+            self._hits[name] += 1
+        else:
+            logging.info(f"Scanning {name}...")
+
+            self._misses[name] += 1
+            if self._cache is not None and not cfg.transform_streaming:
+                file = self._cached(name, schema, dtypes)
+                self._dfs[name] = pl.scan_ipc(file, memory_map=True)
+            else:
+                self._dfs[name] = parse(
+                    pl.scan_csv(
+                        self._csvs[name],
+                        separator=";",
+                        schema=schema,
+                        dtypes=dtypes,
+                        infer_schema_length=10_000,
+                    ),
+                    name,
+                )
+
+        return _select(self._dfs[name], columns)
+
+    def get_excel(self, path: Path, sheet_name: str) -> Frame:
+        name = f"{path.stem.lower()}-{sheet_name.lower()}"
+
+        with self._file_lock(name):
+            if name in self._dfs:
+                self._hits[name] += 1
+            else:
+                logging.info(f"Loading sheet {sheet_name} of {path}...")
+
+                self._misses[name] += 1
+                if self._cache is not None:
+                    file = self._cache.get(
+                        path,
+                        name,
+                        sheet_name,
+                        lambda: pl.read_excel(path, sheet_name=sheet_name),
+                    )
+                    self._dfs[name] = pl.read_ipc(file, memory_map=True)
                 else:
-                    logging.info(f"Loading {name}...")
+                    self._dfs[name] = pl.read_excel(path, sheet_name=sheet_name)
+
+        if cfg.transform_lazy:
+            return self._dfs[name].lazy()
+
+        return self._dfs[name]
+
+    def _read_csv(
+        self,
+        name: str,
+        schema: dict[str, pl.DataType | pl.PolarsDataType] = None,
+        dtypes: dict[str, pl.DataType | pl.PolarsDataType] = None,
+        columns: list[str] = None,
+    ) -> pl.DataFrame:
+        if self._cache is not None:
+            file = self._cached(name, schema, dtypes)
+            if columns is not None:
+                columns = [col for col in pl.read_ipc_schema(file) if col in columns]
+
+            return pl.read_ipc(file, columns=columns, memory_map=True)
+
+        return parse(
+            pl.read_csv(
+                self._csvs[name],
+                separator=";",
+                schema=schema,
+                dtypes=dtypes,
+                columns=columns,
+                infer_schema_length=10_000,
+            ),
+            name,
+        )
 
-                df = pl.read_csv(
+    def _cached(
+        self,
+        name: str,
+        schema: dict[str, pl.DataType | pl.PolarsDataType] = None,
+        dtypes: dict[str, pl.DataType | pl.PolarsDataType] = None,
+    ) -> Path:
+        """
+        Returns the columnar copy of the whole file, parsed with the given schema and the registered formats.
+        """
+        return self._cache.get(
+            self._csvs[name],
+            name,
+            repr((schema, dtypes, sources.get(name))),
+            lambda: parse(
+                pl.read_csv(
                     self._csvs[name],
                     separator=";",
                     schema=schema,
                     dtypes=dtypes,
-                    columns=columns,
                     infer_schema_length=10_000,
-                )
+                ),
+                name,
+            ),
+        )
 
-                if columns is None:
-                    self._dfs[name] = df
+    def spill(self, df: pl.LazyFrame, name: str) -> pl.LazyFrame:
+        """
+        Streams an intermediate frame to a scratch file in the cache directory, or the temporary directory if there is
+        none, and returns a scan of it. The outputs derived from it, which are streamed to their files one by one, then
+        read this file instead of running its plan again. The file is removed by `remove_spills`.
+        """
+        path = Path(cfg.csv_cache_dir or tempfile.gettempdir())
+        path.mkdir(parents=True, exist_ok=True)
+        file = path.joinpath(f"{name}.spill.parquet")
 
-                return df
+        df.sink_parquet(file)
+        with self._lock:
+            self._spills.append(file)
 
-            return self._dfs[name]
+        return pl.scan_parquet(file)
 
-        raise Exception(f"Could not find file {name}.csv")
+    def remove_spills(self):
+        for file in self._spills:
+            file.unlink(missing_ok=True)
+
+        self._spills = []
+
+    def report(self):
+        """
+        Logs how often every file was read and how often a read was served from the cache.
+        """
+        for name in sorted(self._misses | self._hits):
+            logging.info(
+                f"Source {name}: read {self._misses[name]}x, served from cache {self._hits[name]}x"
+            )
+
+            if self._misses[name] > 1:
+                logging.warning(f"Source {name} was read more than once")
+
+
+def _select(df: Frame, columns: list[str] | None) -> Frame:
+    """
+    Selects the given columns in the order they appear in the file, like `pl.read_csv(columns=...)` does. On an eager
+    frame this does not copy any data.
+    """
+    if columns is None:
+        return df
+
+    return df.select([col for col in df.columns if col in columns])
+
+
+def _union(available: list[str] | None, columns: list[str] | None) -> list[str] | None:
+    if available is None or columns is None:
+        return None
+
+    return available + [col for col in columns if col not in available]
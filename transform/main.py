@@ -1,4 +1,8 @@
+import logging
 import sys
+from pathlib import Path
+
+import polars as pl
 
 import config as cfg
 from dataframes import (
@@ -15,9 +19,16 @@ from dataframes import (
     account_entities,
     users,
 )
+from construct.load.ingest import Ingestor
 from graph_construct import Event, Entity, Relation
+from derive import derive
+from incremental import plan
+from scheduler import Task, Scheduler
+from transform.loader import Loader
 from saver import Saver
-from util import execute
+from util import execute, report
+
+pl.enable_string_cache()
 
 s = Saver(cfg.step_nuke_transformed)
 
@@ -106,227 +117,363 @@ payment_r = {
 user_o = {"user": Entity("user")}
 
 
+booking_sources = ["receipt", "invoice", "payment"]
+
+
 def user_performed(event: Event):
     return Relation("performed", user_o["user"], event)
 
 
-def transform():
-    # --- ORDERS ---
-    # -- events --
-    df_order_header_changes, df_order_line_changes = order_change_events.load()
-    s.save_df(df_order_header_changes, order_e["header_change"])
-    s.save_df(df_order_line_changes, order_e["line_change"])
+def sources(module) -> list[Path]:
+    return [Loader().path(name) for name in module.columns]
 
-    df_order_line_creations = order_creation_events.load()
-    s.save_df(df_order_line_creations, order_e["line_creation"])
 
+tasks = [
+    # --- ORDERS ---
+    # -- events --
+    Task(
+        "Order change events",
+        order_change_events.load,
+        outputs=["order_header_changes", "order_line_changes"],
+        sources=sources(order_change_events) + [Path(cfg.activities_file)],
+    ),
+    Task(
+        "Order creation events",
+        order_creation_events.load,
+        outputs=["order_line_creations"],
+        sources=sources(order_creation_events),
+    ),
     # -- entities (objects) --
-    df_order_header_entities, df_order_line_entities = order_entities.load(
-        df_order_line_creations
-    )
-    s.save_df(df_order_header_entities, order_o["header"])
-    s.save_df(df_order_line_entities, order_o["line"])
-
+    Task(
+        "Order entities",
+        order_entities.load,
+        inputs=["order_line_creations"],
+        outputs=["order_header_entities", "order_line_entities"],
+    ),
+    # -- relations --
+    Task(
+        "Order relations",
+        order_relations.load,
+        inputs=["order_header_changes", "order_line_changes", "order_line_creations"],
+        outputs=[
+            "order_header_relation_change",
+            "order_line_relation_change",
+            "order_line_relation_creation",
+            "order_line_relation_part_of_header",
+        ],
+    ),
+    Task(
+        "Order header change users",
+        users.load_relations,
+        inputs=["order_header_changes"],
+        outputs=["order_header_relation_performed_change"],
+    ),
+    Task(
+        "Order line change users",
+        users.load_relations,
+        inputs=["order_line_changes"],
+        outputs=["order_line_relation_performed_change"],
+    ),
+    Task(
+        "Order line creation users",
+        users.load_relations,
+        inputs=["order_line_creations"],
+        outputs=["order_line_relation_performed_creation"],
+    ),
+    # --- RECEIPTS ---
+    Task(
+        "Receipts",
+        receipts.load,
+        outputs=[
+            "receipt_events",
+            "receipt_header_entities",
+            "receipt_line_entities",
+            "receipt_creation",
+            "receipt_relation_booked",
+            "receipt_relation_for",
+            "receipt_relation_part_of",
+        ],
+        sources=sources(receipts),
+    ),
+    Task(
+        "Receipt users",
+        users.load_relations,
+        inputs=["receipt_events"],
+        outputs=["receipt_relation_performed"],
+    ),
+    # --- INVOICES ---
+    # -- events --
+    Task(
+        "Invoice events",
+        invoice_events.load,
+        outputs=["invoice_events"],
+        sources=sources(invoice_events),
+    ),
+    # -- entities (objects) --
+    Task(
+        "Invoice entities",
+        invoice_entities.load,
+        inputs=["invoice_events"],
+        outputs=["invoice_lines", "invoice_headers"],
+    ),
     # -- relations --
-    (
-        df_order_header_relation_change,
-        df_order_line_relation_change,
-        df_order_line_relation_creation,
-        df_order_line_relation_part_of_header,
-    ) = order_relations.load(
-        df_order_header_changes, df_order_line_changes, df_order_line_creations
+    Task(
+        "Invoice relations",
+        invoice_relations.load,
+        inputs=["invoice_events"],
+        outputs=[
+            "invoice_relation_creation",
+            "invoice_relation_booked",
+            "invoice_relation_for",
+            "invoice_relation_part_of",
+        ],
+        sources=sources(invoice_relations),
+    ),
+    Task(
+        "Invoice users",
+        users.load_relations,
+        inputs=["invoice_events"],
+        outputs=["invoice_relation_performed"],
+    ),
+    # --- PAYMENTS (clearances) ---
+    Task(
+        "Payments",
+        payments.load,
+        outputs=[
+            "payment_events",
+            "payment_entities",
+            "payment_relation_creation",
+            "payment_relation_booked",
+            "payment_relation_for",
+        ],
+        sources=sources(payments),
+    ),
+    Task(
+        "Payment users",
+        users.load_relations,
+        inputs=["payment_events"],
+        outputs=["payment_relation_performed"],
+    ),
+]
+
+# --- JOURNAL ENTRIES ---
+tasks += [
+    Task(
+        "Journal entries",
+        lambda *dfs: journals.load(list(dfs), hours=[21, 22, 23]),
+        inputs=[f"{source}_relation_booked" for source in booking_sources],
+        outputs=[
+            f"{source}_journal_entry_{output}"
+            for source in booking_sources
+            for output in [
+                "event_creations",
+                "relation_modified",
+                "entities",
+                "relation_creation",
+            ]
+        ],
+        sources=sources(journals),
     )
-    s.save_df(df_order_header_relation_change, order_r["change_of_header"])
-    s.save_df(df_order_line_relation_change, order_r["change_of_line"])
-    s.save_df(df_order_line_relation_creation, order_r["creation_of_line"])
-    s.save_df(df_order_line_relation_part_of_header, order_r["part_of_header"])
+]
+
+for source in booking_sources:
+    tasks += [
+        Task(
+            f"{source.capitalize()} journal entry users",
+            users.load_relations,
+            inputs=[f"{source}_journal_entry_event_creations"],
+            outputs=[f"{source}_journal_entry_relations_performed"],
+        ),
+    ]
+
+tasks += [
+    # --- ACCOUNTS ---
+    Task(
+        "Accounts",
+        lambda *dfs: account_entities.load(list(dfs)),
+        inputs=[
+            "receipt_journal_entry_relation_modified",
+            "invoice_journal_entry_relation_modified",
+            "payment_journal_entry_relation_modified",
+        ],
+        outputs=["account_entities"],
+        sources=sources(account_entities),
+    ),
+    # --- USERS ---
+    Task(
+        "Users",
+        lambda *dfs: users.load_entities(list(dfs)),
+        inputs=[
+            "order_header_changes",
+            "order_line_changes",
+            "order_line_creations",
+            "receipt_events",
+            "receipt_journal_entry_event_creations",
+            "invoice_journal_entry_event_creations",
+            "payment_journal_entry_event_creations",
+            "invoice_events",
+            "payment_events",
+        ],
+        outputs=["user_entities"],
+    ),
+]
+
+saves = {
+    "order_header_changes": order_e["header_change"],
+    "order_line_changes": order_e["line_change"],
+    "order_line_creations": order_e["line_creation"],
+    "order_header_entities": order_o["header"],
+    "order_line_entities": order_o["line"],
+    "order_header_relation_change": order_r["change_of_header"],
+    "order_line_relation_change": order_r["change_of_line"],
+    "order_line_relation_creation": order_r["creation_of_line"],
+    "order_line_relation_part_of_header": order_r["part_of_header"],
+    "order_header_relation_performed_change": user_performed(order_e["header_change"]),
+    "order_line_relation_performed_change": user_performed(order_e["line_change"]),
+    "order_line_relation_performed_creation": user_performed(order_e["line_creation"]),
+    "receipt_events": receipt_e["creation"],
+    "receipt_header_entities": receipt_o["header"],
+    "receipt_line_entities": receipt_o["line"],
+    "receipt_creation": receipt_r["creation_of"],
+    "receipt_relation_booked": receipt_r["booked_as"],
+    "receipt_relation_for": receipt_r["for"],
+    "receipt_relation_part_of": receipt_r["part_of"],
+    "receipt_relation_performed": user_performed(receipt_e["creation"]),
+    "invoice_events": invoice_e["creation"],
+    "invoice_lines": invoice_o["line"],
+    "invoice_headers": invoice_o["header"],
+    "invoice_relation_creation": invoice_r["creation_of"],
+    "invoice_relation_booked": invoice_r["booked_as"],
+    "invoice_relation_for": invoice_r["for"],
+    "invoice_relation_part_of": invoice_r["part_of"],
+    "invoice_relation_performed": user_performed(invoice_e["creation"]),
+    "payment_events": payment_e["paid"],
+    "payment_entities": payment_o["payment"],
+    "payment_relation_creation": payment_r["creation_of"],
+    "payment_relation_booked": payment_r["booked_as"],
+    "payment_relation_for": payment_r["for"],
+    "payment_relation_performed": user_performed(payment_e["paid"]),
+    "account_entities": journal_o["account"],
+    "user_entities": user_o["user"],
+}
 
-    df_order_header_relation_performed_change = users.load_relations(
-        df_order_header_changes
-    )
-    df_order_line_relation_performed_change = users.load_relations(
-        df_order_line_changes
-    )
-    df_order_line_relation_performed_creation = users.load_relations(
-        df_order_line_creations
-    )
-    s.save_df(
-        df_order_header_relation_performed_change,
-        user_performed(order_e["header_change"]),
-    )
-    s.save_df(
-        df_order_line_relation_performed_change, user_performed(order_e["line_change"])
-    )
-    s.save_df(
-        df_order_line_relation_performed_creation,
-        user_performed(order_e["line_creation"]),
-    )
+for source in booking_sources:
+    saves |= {
+        f"{source}_journal_entry_event_creations": journal_e[f"{source}_creation"],
+        f"{source}_journal_entry_relation_modified": journal_r[f"{source}_modifies"],
+        f"{source}_journal_entry_entities": journal_o[f"{source}_entry"],
+        f"{source}_journal_entry_relation_creation": journal_r[f"{source}_creation_of"],
+        f"{source}_journal_entry_relations_performed": user_performed(
+            journal_e[f"{source}_creation"]
+        ),
+    }
 
-    # --- RECEIPTS ---
-    (
-        df_receipt_events,
-        df_receipt_header_entities,
-        df_receipt_line_entities,
-        df_receipt_creation,
-        df_receipt_relation_booked,
-        df_receipt_relation_for,
-        df_receipt_relation_part_of,
-    ) = receipts.load()
 
-    # -- events --
-    s.save_df(df_receipt_events, receipt_e["creation"])
+# tasks reading the largest sources, which run on the streaming engine if enabled
+streamed = ["Order change events", "Journal entries"]
 
-    # -- entities (objects) --
-    s.save_df(df_receipt_header_entities, receipt_o["header"])
-    s.save_df(df_receipt_line_entities, receipt_o["line"])
 
-    # -- relations --
-    s.save_df(df_receipt_creation, receipt_r["creation_of"])
-    s.save_df(df_receipt_relation_booked, receipt_r["booked_as"])
-    s.save_df(df_receipt_relation_for, receipt_r["for"])
-    s.save_df(df_receipt_relation_part_of, receipt_r["part_of"])
+def stream(task: Task, stamps: dict[str, dict]) -> Task:
+    """
+    Wraps the task so that its outputs are streamed to their files, and downstream tasks read them back from there.
+    The inputs of the task are collected up front, as they are small and may use operations the streaming engine
+    does not support.
+    """
 
-    df_receipt_relation_performed = users.load_relations(df_receipt_events)
-    s.save_df(df_receipt_relation_performed, user_performed(receipt_e["creation"]))
+    def f(*values):
+        values = [v.collect().lazy() for v in values]
+        outputs = task.run(dict(zip(task.inputs, values)))
+        dfs = tuple(
+            s.sink_df(outputs[name], saves[name], stamps.get(name))
+            for name in task.outputs
+        )
+        return dfs if len(dfs) > 1 else dfs[0]
 
-    # --- INVOICES ---
-    # -- events --
-    df_invoice_events = invoice_events.load()
-    s.save_df(df_invoice_events, invoice_e["creation"])
+    return Task(task.name, f, task.inputs, task.outputs, task.sources)
 
-    # -- entities (objects) --
-    df_invoice_lines, df_invoice_headers = invoice_entities.load(df_invoice_events)
-    s.save_df(df_invoice_lines, invoice_o["line"])
-    s.save_df(df_invoice_headers, invoice_o["header"])
 
-    # -- relations --
-    (
-        df_invoice_relation_creation,
-        df_invoice_relation_booked,
-        df_invoice_relation_for,
-        df_invoice_relation_part_of,
-    ) = invoice_relations.load(df_invoice_events)
-    s.save_df(df_invoice_relation_creation, invoice_r["creation_of"])
-    s.save_df(df_invoice_relation_booked, invoice_r["booked_as"])
-    s.save_df(df_invoice_relation_for, invoice_r["for"])
-    s.save_df(df_invoice_relation_part_of, invoice_r["part_of"])
-
-    df_invoice_relation_performed = users.load_relations(df_invoice_events)
-    s.save_df(df_invoice_relation_performed, user_performed(invoice_e["creation"]))
+def set_chunk_size(loader: Loader):
+    """
+    Sizes the batches of the streaming engine from `transform_memory_budget`, so that the batches of all threads fit
+    in it with room for the few batches every operator buffers. The budget is only a hint from which the batch size is
+    estimated: the memory of the operators that hold their state, such as joins and aggregations, is not bounded by it.
+    """
+    row_size = max(loader.row_size(name) for name in ["prom_p2p_changes", "journals"])
+    chunk_size = cfg.transform_memory_budget // (pl.threadpool_size() * row_size * 4)
 
-    # --- PAYMENTS (clearances) ---
-    (
-        df_payment_events,
-        df_payment_entities,
-        df_payment_relation_creation,
-        df_payment_relation_booked,
-        df_payment_relation_for,
-    ) = payments.load()
+    logging.info(f"Streaming in batches of {chunk_size} rows")
+    pl.Config.set_streaming_chunk_size(max(1_000, chunk_size))
 
-    # -- events --
-    s.save_df(df_payment_events, payment_e["paid"])
 
-    # -- entities (objects) --
-    s.save_df(df_payment_entities, payment_o["payment"])
+def ingest(stamps: dict[str, dict]):
+    """
+    Ingests all outputs into the graph. The outputs that were not written again are read back from their files.
+    """
+    ingestor = Ingestor()
+    for name, construct in saves.items():
+        if name not in stamps:
+            ingestor.add(s.load_df(construct), construct)
 
-    # -- relations --
-    s.save_df(df_payment_relation_creation, payment_r["creation_of"])
-    s.save_df(df_payment_relation_booked, payment_r["booked_as"])
-    s.save_df(df_payment_relation_for, payment_r["for"])
-
-    df_payment_relation_performed = users.load_relations(df_payment_events)
-    s.save_df(df_payment_relation_performed, user_performed(payment_e["paid"]))
-
-    # --- JOURNAL ENTRIES ---
-    (
-        df_receipt_journal_entry_event_creations,
-        df_receipt_journal_entry_relation_modified,
-        df_receipt_journal_entry_entities,
-        df_receipt_journal_entry_relation_creation,
-    ) = journals.load(df_receipt_relation_booked)
-    s.save_df(df_receipt_journal_entry_event_creations, journal_e["receipt_creation"])
-    s.save_df(df_receipt_journal_entry_relation_modified, journal_r["receipt_modifies"])
-    s.save_df(df_receipt_journal_entry_entities, journal_o["receipt_entry"])
-    s.save_df(
-        df_receipt_journal_entry_relation_creation, journal_r["receipt_creation_of"]
-    )
+    ingestor.flush()
 
-    df_receipt_journal_entry_relations_performed = users.load_relations(
-        df_receipt_journal_entry_event_creations
-    )
-    s.save_df(
-        df_receipt_journal_entry_relations_performed,
-        user_performed(journal_e["receipt_creation"]),
-    )
 
-    (
-        df_invoice_journal_entry_event_creations,
-        df_invoice_journal_entry_relation_modified,
-        df_invoice_journal_entry_entities,
-        df_invoice_journal_entry_relation_creation,
-    ) = journals.load(df_invoice_relation_booked)
-    s.save_df(df_invoice_journal_entry_event_creations, journal_e["invoice_creation"])
-    s.save_df(df_invoice_journal_entry_relation_modified, journal_r["invoice_modifies"])
-    s.save_df(df_invoice_journal_entry_entities, journal_o["invoice_entry"])
-    s.save_df(
-        df_invoice_journal_entry_relation_creation, journal_r["invoice_creation_of"]
-    )
+def transform():
+    if cfg.transform_derive and cfg.transform_ingest:
+        raise Exception("The derived files can only be loaded by the bulk import")
 
-    df_invoice_journal_entry_relations_performed = users.load_relations(
-        df_invoice_journal_entry_event_creations
-    )
-    s.save_df(
-        df_invoice_journal_entry_relations_performed,
-        user_performed(journal_e["invoice_creation"]),
-    )
+    loader = Loader()
+    for module in [
+        order_change_events,
+        order_creation_events,
+        receipts,
+        journals,
+        invoice_events,
+        invoice_relations,
+        payments,
+        account_entities,
+    ]:
+        loader.require(module.columns)
 
-    (
-        df_payment_journal_entry_event_creations,
-        df_payment_journal_entry_relation_modified,
-        df_payment_journal_entry_entities,
-        df_payment_journal_entry_relation_creation,
-    ) = journals.load(df_payment_relation_booked)
-    s.save_df(df_payment_journal_entry_event_creations, journal_e["payment_creation"])
-    s.save_df(df_payment_journal_entry_relation_modified, journal_r["payment_modifies"])
-    s.save_df(df_payment_journal_entry_entities, journal_o["payment_entry"])
-    s.save_df(
-        df_payment_journal_entry_relation_creation, journal_r["payment_creation_of"]
-    )
+    stale, stamps = plan(tasks, saves)
 
-    df_payment_journal_entry_relations_performed = users.load_relations(
-        df_payment_journal_entry_event_creations
-    )
-    s.save_df(
-        df_payment_journal_entry_relations_performed,
-        user_performed(journal_e["payment_creation"]),
-    )
+    if cfg.transform_streaming:
+        if not cfg.transform_lazy:
+            raise Exception("Streaming requires transform_lazy to be enabled")
 
-    # --- ACCOUNTS ---
-    df_account_entities = account_entities.load(
-        [
-            df_receipt_journal_entry_relation_modified,
-            df_invoice_journal_entry_relation_modified,
-            df_payment_journal_entry_relation_modified,
-        ]
-    )
-    s.save_df(df_account_entities, journal_o["account"])
+        if cfg.transform_memory_budget is not None:
+            set_chunk_size(loader)
 
-    # --- USERS ---
-    df_user_entities = users.load_entities(
-        [
-            df_order_header_changes,
-            df_order_line_changes,
-            df_order_line_creations,
-            df_receipt_events,
-            df_receipt_journal_entry_event_creations,
-            df_invoice_journal_entry_event_creations,
-            df_payment_journal_entry_event_creations,
-            df_invoice_events,
-            df_payment_events,
-        ]
-    )
-    s.save_df(df_user_entities, user_o["user"])
+        stale = [stream(t, stamps) if t.name in streamed else t for t in stale]
+
+    def save(task: Task, outputs: dict):
+        if cfg.transform_streaming and task.name in streamed:
+            return
+
+        for name, df in outputs.items():
+            if name in stamps:
+                s.save_df(df, saves[name], stamps[name])
+
+    Scheduler(stale, cfg.transform_workers).run(save)
+
+    s.flush()
+    loader.remove_spills()
+
+    if cfg.transform_ingest:
+        ingest(stamps)
+
+    loader.report()
 
 
 execute("Transform", transform)
+
+
+def derive_graph():
+    derive()
+    s.flush()
+
+
+if cfg.transform_derive:
+    execute("Derive compound entities", derive_graph)
+
+report("transform")
 sys.exit()
@@ -1,34 +1,201 @@
+import json
 import logging
+import re
+import threading
 from pathlib import Path
 
 import polars as pl
 
 import config as cfg
+from construct.load.ingest import Ingestor
 from graph_construct import GraphConstruct
+from util import count_rows, file_digest
 
 
 class Saver(object):
     _instance = None
     _path = None
+    _pending = None
+    _manifest = None
+    _ingestor = None
+    _lock = threading.Lock()
 
     def __new__(cls, nuke: bool = False):
         if cls._instance is None:
             cls._instance = super(Saver, cls).__new__(cls)
             cls._path = Path(cfg.transform_export_dir)
             cls._path.mkdir(parents=True, exist_ok=True)
+            cls._pending = []
+
+            if cfg.transform_ingest:
+                cls._ingestor = Ingestor()
+
+            manifest = cls._path.joinpath("manifest.json")
 
             if nuke:
                 logging.info("☢️ Nuking export directory...")
-                for f in cls._path.glob("*.csv"):
+                for f in [*cls._path.glob("*.csv"), *cls._path.glob("*.schema.json")]:
                     f.unlink()
+                manifest.unlink(missing_ok=True)
+
+            cls._manifest = {"sources": {}, "outputs": {}}
+            if manifest.exists():
+                cls._manifest = json.loads(manifest.read_text())
 
         return cls._instance
 
-    def save_df(self, df: pl.DataFrame, construct: GraphConstruct):
-        file = self._path.joinpath(f"{construct.file_name()}.csv")
+    def save_df(
+        self,
+        df: pl.DataFrame | pl.LazyFrame,
+        construct: GraphConstruct,
+        stamp: dict = None,
+    ):
+        """
+        Writes the frame to the file of the construct, decoding categoricals to strings, and records its schema in the
+        manifest, together with the stamp if one is given, and in a sidecar next to the file. If ingestion is enabled,
+        the frame is handed to the ingestor instead, and no file is written.
+        """
+        if isinstance(df, pl.LazyFrame):
+            with self._lock:
+                self._pending.append((df, construct, stamp))
+            return
+
+        if self._ingestor is not None:
+            self._ingestor.add(df, construct)
+            count_rows(construct.file_name(), len(df))
+            return
+
+        file = self._file(construct)
 
         file.touch(exist_ok=True)
 
-        df.write_csv(file=file, separator=";")
+        df.with_columns(pl.col(pl.Categorical).cast(pl.Utf8)).write_csv(
+            file=file, separator=";"
+        )
+
+        self._record(construct, df.schema, stamp)
+        count_rows(construct.file_name(), len(df))
 
         logging.info(f"Wrote to file {file}")
+
+    def sink_df(
+        self, df: pl.LazyFrame, construct: GraphConstruct, stamp: dict = None
+    ) -> pl.LazyFrame:
+        """
+        Runs the frame on the streaming engine and writes it to the file of the construct batch by batch, so that it
+        never has to fit in memory. Returns a scan of the written file for downstream tasks. If ingestion is enabled,
+        the frame is collected on the streaming engine and handed to the ingestor instead, and no file is written.
+        """
+        if self._ingestor is not None:
+            df = df.collect(streaming=True)
+            self._ingestor.add(df, construct)
+            count_rows(construct.file_name(), len(df))
+            return df.lazy()
+
+        file = self._file(construct)
+        schema = df.schema
+
+        df.with_columns(pl.col(pl.Categorical).cast(pl.Utf8)).sink_csv(
+            file, separator=";"
+        )
+
+        self._record(construct, schema, stamp)
+        df = pl.scan_csv(file, separator=";", schema=schema)
+        count_rows(construct.file_name(), df.select(pl.count()).collect().item())
+
+        logging.info(f"Streamed to file {file}")
+
+        return df
+
+    def load_df(self, construct: GraphConstruct) -> pl.DataFrame | pl.LazyFrame:
+        """
+        Reads a file that was written before back, with the schema it was written with.
+        """
+        file = self._file(construct)
+        entry = self._manifest["outputs"][construct.file_name()]
+        schema = {col: _dtype(dtype) for col, dtype in entry["schema"].items()}
+
+        logging.info(f"Reading unchanged file {file}")
+
+        if cfg.transform_lazy:
+            return pl.scan_csv(file, separator=";", schema=schema)
+
+        return pl.read_csv(file, separator=";", schema=schema)
+
+    def is_current(self, construct: GraphConstruct, stamp: dict) -> bool:
+        """
+        Whether the file of the construct exists and was written with the given stamp.
+        """
+        entry = self._manifest["outputs"].get(construct.file_name())
+        if entry is None or not self._file(construct).exists():
+            return False
+
+        return all(entry.get(key) == value for key, value in stamp.items())
+
+    def digest(self, file: Path) -> str:
+        """
+        Returns the content hash of a source file. The hash is kept in the manifest and only computed again when the
+        size or modification time of the file changed.
+        """
+        stat = file.stat()
+        entry = self._manifest["sources"].get(str(file))
+
+        if (
+            entry is None
+            or entry["size"] != stat.st_size
+            or entry["mtime"] != stat.st_mtime_ns
+        ):
+            entry = {
+                "size": stat.st_size,
+                "mtime": stat.st_mtime_ns,
+                "digest": file_digest(file),
+            }
+            with self._lock:
+                self._manifest["sources"][str(file)] = entry
+
+        return entry["digest"]
+
+    def flush(self):
+        """
+        Collects all lazily saved frames at once, so that plans shared between them are only executed once, and
+        writes them to their files. Then writes the manifest.
+        """
+        if len(self._pending) > 0:
+            logging.info(f"Collecting {len(self._pending)} lazy frames...")
+
+            pending, self._pending = self._pending, []
+            dfs = pl.collect_all([df for df, _, _ in pending])
+
+            for df, (_, construct, stamp) in zip(dfs, pending):
+                self.save_df(df, construct, stamp)
+
+        self._path.joinpath("manifest.json").write_text(
+            json.dumps(self._manifest, indent=2)
+        )
+
+    def _record(self, construct: GraphConstruct, schema: dict, stamp: dict = None):
+        """
+        Records the schema of a written file in the manifest, and in a sidecar next to the file from which the loader
+        converts every column to its type.
+        """
+        entry = {"schema": {col: str(dtype) for col, dtype in schema.items()}}
+        with self._lock:
+            self._manifest["outputs"][construct.file_name()] = (stamp or {}) | entry
+
+        self._file(construct).with_suffix(".schema.json").write_text(
+            json.dumps(entry["schema"], indent=2)
+        )
+
+    def _file(self, construct: GraphConstruct) -> Path:
+        return self._path.joinpath(f"{construct.file_name()}.csv")
+
+
+def _dtype(name: str) -> pl.PolarsDataType:
+    """
+    Parses the string representation of a data type, such as `Int64` or `Datetime(time_unit='us', time_zone=None)`.
+    Categoricals are read back as categoricals, so downstream tasks see the same schema as when they were written.
+    """
+    if name.startswith("Datetime"):
+        return pl.Datetime(re.search(r"time_unit='(\w+)'", name).group(1))
+
+    return getattr(pl, name.split("(")[0])
@@ -0,0 +1,150 @@
+import polars as pl
+
+
+class Temporal:
+    """
+    A date, time or datetime column, parsed from a string with an explicit format.
+    """
+
+    def __init__(self, dtype: pl.PolarsDataType, format: str):
+        self.dtype = dtype
+        self.format = format
+
+    def parse(self, column: str) -> pl.Expr:
+        return pl.col(column).str.strptime(self.dtype, self.format)
+
+    def __repr__(self):
+        return f"Temporal({self.dtype}, {self.format!r})"
+
+
+class Amount:
+    """
+    A decimal column, parsed from a string after stripping the currency symbol and thousands separators.
+    """
+
+    def __init__(self, decimal: str = ".", thousands: str = None, currency: str = None):
+        self.decimal = decimal
+        self.thousands = thousands
+        self.currency = currency
+
+    def parse(self, column: str) -> pl.Expr:
+        expr = pl.col(column)
+        if self.currency is not None:
+            expr = expr.str.replace_all(self.currency, "", literal=True)
+        if self.thousands is not None:
+            expr = expr.str.replace_all(self.thousands, "", literal=True)
+        if self.decimal != ".":
+            expr = expr.str.replace_all(self.decimal, ".", literal=True)
+
+        return expr.str.strip_chars().cast(pl.Float64)
+
+    def __repr__(self):
+        return f"Amount({self.decimal!r}, {self.thousands!r}, {self.currency!r})"
+
+
+Type = pl.PolarsDataType | Temporal | Amount
+
+date = Temporal(pl.Datetime, "%d-%m-%Y")
+
+# types of the columns the transform uses per source file, matched by name, where low-cardinality strings are read as
+# categoricals; other columns are inferred
+sources: dict[str, dict[str, Type]] = {
+    "gl_master_data": {
+        "%GL_ACC": pl.Int64,
+        "GL Acc Desc": pl.Utf8,
+        "GL Acc Type": pl.Utf8,
+    },
+    "journals": {
+        "%GL_DOC": pl.Utf8,
+        "%GL_ACC": pl.Int64,
+        "#GL Credit": pl.Float64,
+        "#GL Debit": pl.Float64,
+        "GL Entry Date": date,
+        "GL Effective Date": date,
+        "GL User": pl.Categorical,
+        "%GL_PI": pl.Utf8,
+    },
+    "linktable_purchases": {
+        "%PR_LINE_NO": pl.Utf8,
+        "%PO_LINE_NO": pl.Utf8,
+        "%PI_LINE_NO": pl.Utf8,
+        "%GL_DOC": pl.Utf8,
+    },
+    "manual_exchange_rates": {
+        "PI_No": pl.Utf8,
+        "Exchange_Rate": Amount(decimal=","),
+    },
+    "payments": {
+        "%BKPF": pl.Int64,
+        "%INVOICE": pl.Utf8,
+        "Invoice type": pl.Categorical,
+        "Timestamp": Temporal(pl.Datetime, "%d-%m-%Y %H:%M:%S"),
+        "Activity": pl.Categorical,
+        "Resource": pl.Categorical,
+    },
+    "prom_p2p_changes": {
+        "CHG TABNAME": pl.Categorical,
+        "CHG FNAME": pl.Categorical,
+        "CHG UDATE": Temporal(pl.Date, "%d-%m-%Y"),
+        "CHG UTIME": Temporal(pl.Time, "%H:%M:%S"),
+        "CHG OBJECTID": pl.Int64,
+        "CHG USERNAME": pl.Categorical,
+        "CHG TABKEY": pl.Int64,
+    },
+    "purchase_invoices": {
+        "%PI_NO": pl.Utf8,
+        "%PI_LINE_NO": pl.Utf8,
+        "#PI Price": pl.Float64,
+        "#PI Quantity": pl.Int64,
+        "PI Posting Date": date,
+        "PI User": pl.Categorical,
+        "PI No": pl.Int64,
+        "PI Item Type": pl.Categorical,
+    },
+    "purchase_orders": {
+        "PO No": pl.Int64,
+        "%PO_LINE_NO": pl.Utf8,
+        "#PO Price": Amount(thousands=",", currency="€"),
+        "#PO Quantity": pl.Int64,
+        "PO Posting Date": date,
+        "PO User": pl.Categorical,
+        "PO Item Type": pl.Categorical,
+    },
+    "purchase_receipts": {
+        "%PR_LINE_NO": pl.Utf8,
+        "#PR Quantity": pl.Int64,
+        "PR Item Type": pl.Categorical,
+        "PR Receipt Type": pl.Categorical,
+        "PR Posting Date": date,
+        "PR User": pl.Categorical,
+        "PR Company Code": pl.Utf8,
+        "PR No": pl.Int64,
+        "PR Fiscal Year": pl.Int64,
+    },
+}
+
+
+def read_dtypes(name: str, header: list[str]) -> dict[str, pl.PolarsDataType]:
+    """
+    Returns the types to read the registered columns of a file with, by name, in which parsed columns are read as
+    strings. Only columns in the header of the file are included, as polars rejects types for columns it does not
+    have, so an extract with more columns or another column order is read the same.
+    """
+    return {
+        col: pl.Utf8 if isinstance(t, (Temporal, Amount)) else t
+        for col, t in sources.get(name, {}).items()
+        if col in header
+    }
+
+
+def parse(df: pl.DataFrame | pl.LazyFrame, name: str) -> pl.DataFrame | pl.LazyFrame:
+    """
+    Parses the string columns of a file that was read with `read_dtypes` into their registered types.
+    """
+    return df.with_columns(
+        [
+            t.parse(col)
+            for col, t in sources.get(name, {}).items()
+            if col in df.columns and isinstance(t, (Temporal, Amount))
+        ]
+    )
@@ -1,9 +1,160 @@
+import hashlib
+import json
 import logging
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import psutil
+
+import config as cfg
+
+try:
+    import resource
+except ImportError:
+    resource = None
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
 
+stages = []
+_lock = threading.Lock()
+
 
 def execute(action: str, f):
+    """
+    Runs a stage and records its wall time, CPU time, growth of the peak memory usage, and the number of rows written
+    and the throughput per file while it ran.
+    """
     logging.info(f"{action} started.")
+
+    stage = {"stage": action, "rows": {}, "throughput": {}, "queries": []}
+    stages.append(stage)
+
+    wall, cpu, rss = time.perf_counter(), time.process_time(), _peak_rss()
     f()
-    logging.info(f"{action} ended.")
+    stage["wall"] = time.perf_counter() - wall
+    stage["cpu"] = time.process_time() - cpu
+    stage["peak_rss_delta"] = _peak_rss() - rss
+
+    logging.info(f"{action} ended in {stage['wall']:.2f}s.")
+
+
+def count_rows(name: str, rows: int):
+    """
+    Records the number of rows written to a file by the current stage.
+    """
+    if len(stages) > 0:
+        stages[-1]["rows"][name] = rows
+
+
+def count_throughput(name: str, rows: int, seconds: float):
+    """
+    Records the number of rows per second at which a file was loaded by the current stage.
+    """
+    throughput = rows / max(seconds, 1e-9)
+    logging.info(
+        f"Loaded {rows} rows of {name} in {seconds:.2f}s ({throughput:.0f} rows/s)"
+    )
+
+    count_rows(name, rows)
+    if len(stages) > 0:
+        stages[-1]["throughput"][name] = throughput
+
+
+def count_query(entry: dict):
+    """
+    Records a query that ran in the current stage, without its parameters. Queries that took at least
+    `slow_query_seconds` are also appended to the slow query log with their parameters and the stage they ran in.
+    """
+    stage = stages[-1]["stage"] if len(stages) > 0 else None
+    if stage is not None:
+        with _lock:
+            stages[-1]["queries"].append(
+                {k: v for k, v in entry.items() if k != "parameters"}
+            )
+
+    if entry["seconds"] < cfg.slow_query_seconds:
+        return
+
+    logging.warning(f"Slow query took {entry['seconds']:.2f}s: \n {entry['query']}")
+
+    file = Path(cfg.slow_query_log)
+    file.parent.mkdir(parents=True, exist_ok=True)
+    with _lock, file.open("a") as f:
+        f.write(json.dumps({"stage": stage} | entry, default=str) + "\n")
+
+
+def report(name: str):
+    """
+    Writes the recorded stages to a JSON run report, and compares them to the previous report of the same name. Stages
+    whose wall or CPU time grew by more than `report_regression_factor` are logged as regressions.
+    """
+    path = Path(cfg.report_dir)
+    path.mkdir(parents=True, exist_ok=True)
+
+    previous = sorted(path.glob(f"{name}-*.json"))
+    regressions = []
+    if len(previous) > 0:
+        before = {s["stage"]: s for s in json.loads(previous[-1].read_text())["stages"]}
+        for stage in stages:
+            if stage["stage"] in before:
+                regression = _regression(before[stage["stage"]], stage)
+                if regression is not None:
+                    regressions.append(regression)
+
+    for r in regressions:
+        logging.warning(
+            f"Stage {r['stage']} regressed: {r['metric']} {r['before']:.2f}s -> {r['after']:.2f}s"
+        )
+
+    started = datetime.now().strftime("%Y%m%d-%H%M%S")
+    file = path.joinpath(f"{name}-{started}.json")
+    file.write_text(
+        json.dumps(
+            {"name": name, "stages": stages, "regressions": regressions},
+            indent=2,
+            default=str,
+        )
+    )
+
+    logging.info(f"Wrote run report to file {file}")
+
+
+def _regression(before: dict, after: dict) -> dict | None:
+    for metric in ["wall", "cpu"]:
+        if (
+            after[metric] > before[metric] * cfg.report_regression_factor
+            and after[metric] - before[metric] > cfg.report_regression_min_seconds
+        ):
+            return {
+                "stage": after["stage"],
+                "metric": metric,
+                "before": before[metric],
+                "after": after[metric],
+            }
+
+    return None
+
+
+def _peak_rss() -> int:
+    """
+    Returns the peak resident set size of the process in bytes. Windows has no `resource`, so there it is the peak
+    working set.
+    """
+    if resource is None:
+        return psutil.Process().memory_info().peak_wset
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def file_digest(file: Path) -> str:
+    digest = hashlib.sha256()
+    with file.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
@@ -6,7 +6,7 @@ import streamlit as st
 from streamlit_agraph import agraph, Node, Config, Edge
 
 import config as cfg
-from driver import Driver
+from driver import Driver, query_all
 
 locale.setlocale(locale.LC_ALL, "")
 
@@ -15,30 +15,33 @@ cs = [f"c{x}" for x in range(len(cfg.controls))]
 
 @st.cache_data
 def load_initial():
-    driver = Driver()
-
-    invoice_amounts = driver.query(
-        f"""
+    df_amounts, df_violations = query_all(
+        [
+            (
+                f"""
             MATCH (e:Event {{ EventType: 'INVOICE_LINE_CREATED' }})
             WHERE e.PI_Line_No CONTAINS "-2022" AND e.Item_Type = "_Handelsartikelen"
-            WITH e.PI_No AS invoice, e.PI_Line_No AS invoice_line, round(toFloat(e.Quantity) * toFloat(e.Price) * toFloat(e.Exchange_Rate), 2) AS amount
+            WITH e.PI_No AS invoice, e.PI_Line_No AS invoice_line, round(e.Quantity * e.Price * e.Exchange_Rate, 2) AS amount
             RETURN *
-        """
-    )
-
-    invoice_violations = driver.query(
-        f"""
+        """,
+                {},
+            ),
+            (
+                f"""
             MATCH (e:Event {{ EventType: "INVOICE_LINE_CREATED" }}), 
                   (e)-[:CORR]->(:Entity:Root)<-[:CORR]-(:Event)-[:VIOLATES]->(c:Control)
             WHERE e.PI_Line_No CONTAINS "-2022" AND e.Item_Type = "_Handelsartikelen"
             WITH e.PI_Line_No AS invoice_line, collect(DISTINCT c.ID) AS violations
             WITH invoice_line, {','.join([f'"{c}" IN violations as {c}' for c in cs])}
             RETURN *
-        """
+        """,
+                {},
+            ),
+        ],
+        read=True,
+        frames=True,
     )
 
-    df_amounts = pl.DataFrame(invoice_amounts)
-    df_violations = pl.DataFrame(invoice_violations)
     df_combined = (
         df_amounts.join(df_violations, on="invoice_line", how="left")
         .with_columns(pl.all().fill_null(pl.lit(False)))
@@ -130,8 +133,8 @@ def load_process_instance_data(line_no: str):
     driver = Driver()
 
     data = driver.query(
-        f"""
-        MATCH (:Event {{ EventType: "INVOICE_LINE_CREATED", PI_Line_No: "{line_no}" }})-[:CORR]->(r:Root)
+        """
+        MATCH (:Event { EventType: "INVOICE_LINE_CREATED", PI_Line_No: $line_no })-[:CORR]->(r:Root)
         WITH r
         MATCH (r)<-[:CORR]-(e:Event),
               (e)-[c:CORR]->(n:Entity WHERE n.Compound IS NULL),
@@ -146,7 +149,8 @@ def load_process_instance_data(line_no: str):
         UNWIND corr AS c
         WITH events, collect(c) AS corr, entities, df, violations, controls, collect(properties(c)) AS corr_properties
         RETURN *
-    """
+    """,
+        {"line_no": line_no},
     )
 
     e = data[0]["events"]